@@ -0,0 +1,131 @@
+import sys
+import random
+import struct
+import argparse
+
+# Deterministic synthetic nX-U8 ROM generator for benchmarking.
+# The same (size, seed, funcs, tables) always produces the same bytes.
+
+def generate(size = 0x10000, seed = 0, funcs = 64, tables = 6, data = 8):
+	if size % 0x10000 != 0 or not 0 < size <= 0x100000: raise ValueError('size must be a multiple of 0x10000 up to 0x100000')
+	r = random.Random(seed)
+	# background is random bytes, so everything not reached by the traversal ends up as DB data
+	rom = bytearray(r.getrandbits(8) for _ in range(size))
+	nseg = size // 0x10000
+	ptr = {s: 0x200 if s == 0 else 0x100 for s in range(nseg)}
+	def w16(a, v): rom[a:a+2] = struct.pack('<H', v & 0xffff)
+
+	# POP PC, reached through BL like __indru8
+	indru8 = 0x180
+	w16(indru8, 0xf28e)
+
+	# function entry points. the first two are in segment 0 as they are used for the vectors
+	addrs = []
+	for i in range(funcs):
+		s = r.randrange(nseg) if i > 1 else 0
+		a = ptr[s]
+		if a > 0xf000: continue
+		addrs.append((s << 16) | a)
+		ptr[s] = a + r.randrange(0x40, 0x200) & 0xfffe
+
+	def emit_func(fa):
+		a = fa
+		end = a + 0x3c
+		def put(*ws):
+			nonlocal a
+			for x in ws:
+				w16(a, x)
+				a += 2
+		push = r.random() < 0.5
+		if push: put(0xf8ce)  # PUSH LR
+		while a < end - 12:
+			k = r.randrange(14)
+			n = r.randrange(16)
+			m = r.randrange(8)*2
+			if k == 0: put(0x0000 | n << 8 | r.randrange(256))  # MOV Rn, #imm8
+			elif k == 1: put(0x1000 | n << 8 | r.randrange(256))  # ADD Rn, #imm8
+			elif k == 2: put(0x9010 | n << 8, r.randrange(0x8000, 0x10000) & 0xfffe)  # L Rn, Dadr
+			elif k == 3: put(0x9011 | n << 8, r.randrange(0x8000, 0x10000) & 0xfffe)  # ST Rn, Dadr
+			elif k == 4:
+				# BL Cadr, builds the call tree
+				t = addrs[r.randrange(len(addrs))]
+				put(0xf001 | (t >> 16) << 8, t & 0xffff)
+			elif k == 5: put(0xc000 | r.randrange(15) << 8 | 1, 0x0000 | n << 8 | r.randrange(256))  # BC cond, skipping one word
+			elif k == 6: put(0xe000 | m << 8 | r.randrange(128))  # MOV ERn, #imm7
+			elif k == 7: put(0xa080 | r.randrange(8) << 4, r.randrange(0x8000, 0x10000))  # SB Dbitadr
+			elif k == 8: put(0x8000 | n << 8 | r.randrange(16) << 4 | r.randrange(10))  # register ALU ops
+			elif k == 9: put(0xe300 | r.randrange(16), 0x9010 | n << 8, r.randrange(0x10000))  # DSR prefixed L
+			elif k == 10: put(0xa008 | m << 8 | r.randrange(8) << 5, r.randrange(0x10000))  # L ERn, Disp16[ERm]
+			elif k == 11: put(0x2000 | n << 8 | r.randrange(256), 0x4000 | n << 8 | r.randrange(256))
+			elif k == 12: put(0x0000 | (n & 14) << 8 | r.randrange(256), 0x0000 | (n | 1) << 8 | r.randrange(256))  # MOV pair
+			elif k == 13: put(0xb000 | m << 8 | r.randrange(64), 0xfe8f)
+		if push: put(0xf28e)  # POP PC
+		else: put(0xfe1f)  # RT
+	for fa in addrs: emit_func(fa)
+
+	# jump tables, alternating between near (B ERn) and far (__indru8)
+	for t in range(tables):
+		a = ptr[0]
+		if a > 0xe000: break
+		tbl = a + 0x20
+		ents = r.randrange(2, 8)
+		if t % 2 == 0:
+			for i, x in enumerate((0xa208, tbl, 0xf022)): w16(a + i*2, x)  # L ER2, tbl[ER0]; B ER2
+			ca = tbl + ents*2
+			for e in range(ents):
+				w16(tbl + e*2, ca)
+				w16(ca, 0xfe1f)
+				ca += 2
+			ptr[0] = ca + 0x20
+		else:
+			for i, x in enumerate((0xa208, tbl, 0xf25e, 0xf001, indru8, 0xfe1f)): w16(a + i*2, x)  # L ER2, tbl[ER0]; PUSH ER2; BL __indru8
+			for e in range(ents):
+				tf = addrs[r.randrange(len(addrs))]
+				w16(tbl + e*4, tf & 0xffff)
+				w16(tbl + e*4 + 2, tf >> 16)
+			w16(tbl + ents*4, 0xffff)
+			w16(tbl + ents*4 + 2, 0xffff)
+			ptr[0] = tbl + ents*4 + 0x20
+		addrs.append(a)
+
+	# vector table: initial SP, entry point, BRK and interrupts
+	w16(0, 0xf000)
+	w16(2, addrs[0] & 0xffff)
+	w16(4, addrs[1] & 0xffff)
+	for v in range(6, 0x40, 2):
+		t = addrs[r.randrange(len(addrs))]
+		w16(v, t & 0xffff if t >> 16 == 0 else 0x200)
+
+	# the entry point calls the jump table users and a few functions
+	a = addrs[0]
+	for t in addrs[-tables:] + addrs[2:10]:
+		w16(a, 0xf001 | (t >> 16) << 8)
+		w16(a+2, t & 0xffff)
+		a += 4
+	w16(a, 0xfe1f)
+
+	# data blobs: strings, zero fill and 0xff padding
+	for i in range(data):
+		s = r.randrange(nseg)
+		a = ptr[s] + 0x10
+		n = r.randrange(0x20, 0x200)
+		if a + n > 0x10000: continue
+		a |= s << 16
+		kind = i % 3
+		if kind == 0: rom[a:a+n] = bytes(0x20 + r.randrange(0x5f) for _ in range(n))
+		elif kind == 1: rom[a:a+n] = bytes(n)
+		else: rom[a:a+n] = b'\xff'*n
+		ptr[s] += n + 0x10 & 0xfffe
+	return rom
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Generates a deterministic synthetic nX-U8 ROM for benchmarking.')
+	parser.add_argument('output', help = 'filename of the generated ROM')
+	parser.add_argument('-s', '--size', type = lambda x: int(x, 0), default = 0x10000, help = 'ROM size, a multiple of 0x10000 (default: 0x10000)')
+	parser.add_argument('--seed', type = int, default = 0, help = 'random seed (default: 0)')
+	parser.add_argument('-f', '--funcs', type = int, default = 64, help = 'number of functions (default: 64)')
+	parser.add_argument('-t', '--tables', type = int, default = 6, help = 'number of jump tables (default: 6)')
+	parser.add_argument('-d', '--data', type = int, default = 8, help = 'number of data blobs (default: 8)')
+	args = parser.parse_args()
+
+	with open(args.output, 'wb') as f: f.write(generate(args.size, args.seed, args.funcs, args.tables, args.data))
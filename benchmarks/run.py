@@ -0,0 +1,95 @@
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import disas
+import main_cli
+import gen_rom
+
+# Times the decoder, the traversal and the listing writer separately on a synthetic ROM.
+# Each phase is run --repeat times and the best time is kept; peak memory comes from one extra traced run.
+
+def phase_decode(rom):
+	dis = disas.Disassembly(rom)
+	n = 0
+	for i in range(0, len(rom), 2):
+		try: dis.decode(rom[i] | rom[i+1] << 8)
+		except RuntimeError: pass
+		n += 1
+	return n
+
+def phase_traverse(rom):
+	dis = disas.Disassembly(rom)
+	dis.disassemble()
+	return len(dis.code)
+
+def phase_write(rom, dis):
+	f = io.StringIO()
+	main_cli.write_listing(f, dis, rom, {}, {}, {})
+	return len(dis.code)
+
+def measure(func, repeat):
+	times = []
+	for i in range(repeat):
+		t = time.perf_counter()
+		n = func()
+		times.append(time.perf_counter() - t)
+	tracemalloc.start()
+	func()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return {'time': min(times), 'times': times, 'count': n, 'rate': n / min(times), 'peak_mem': peak}
+
+def run(size, seed, funcs, tables, data, repeat):
+	rom = bytes(gen_rom.generate(size, seed, funcs, tables, data))
+	results = {
+		'rom': {'size': size, 'seed': seed, 'funcs': funcs, 'tables': tables, 'data': data, 'sha256': hashlib.sha256(rom).hexdigest()},
+		'python': platform.python_version(),
+		'numpy': disas.has_numpy,
+		'phases': {},
+	}
+	results['phases']['decode'] = dict(measure(lambda: phase_decode(rom), repeat), unit = 'words/s')
+	results['phases']['traverse'] = dict(measure(lambda: phase_traverse(rom), repeat), unit = 'instr/s')
+	dis = disas.Disassembly(rom)
+	dis.disassemble()
+	results['phases']['write'] = dict(measure(lambda: phase_write(rom, dis), repeat), unit = 'instr/s')
+	return results
+
+def report(results, base = None):
+	print(f'ROM: {results["rom"]["size"]:#x} bytes, seed {results["rom"]["seed"]}, {results["rom"]["funcs"]} functions, {results["rom"]["tables"]} jump tables')
+	for name, p in results['phases'].items():
+		line = f'{name:10}{p["time"]*1000:10.1f} ms{p["rate"]:14,.0f} {p["unit"]:9}{p["peak_mem"]/1048576:8.1f} MiB peak'
+		if base is not None and name in base['phases']:
+			b = base['phases'][name]
+			line += f'    {b["time"] / p["time"]:5.2f}x vs base ({b["time"]*1000:.1f} ms)'
+		print(line)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'PyU8disasX benchmark runner.')
+	parser.add_argument('-s', '--size', type = lambda x: int(x, 0), default = 0x40000, help = 'ROM size, a multiple of 0x10000 (default: 0x40000)')
+	parser.add_argument('--seed', type = int, default = 1, help = 'random seed (default: 1)')
+	parser.add_argument('-f', '--funcs', type = int, default = 400, help = 'number of functions (default: 400)')
+	parser.add_argument('-t', '--tables', type = int, default = 6, help = 'number of jump tables (default: 6)')
+	parser.add_argument('-d', '--data', type = int, default = 8, help = 'number of data blobs (default: 8)')
+	parser.add_argument('-r', '--repeat', type = int, default = 3, help = 'runs per phase (default: 3)')
+	parser.add_argument('-o', '--output', help = 'save the results to a JSON file')
+	parser.add_argument('-c', '--compare', help = 'compare against results saved earlier with -o')
+	args = parser.parse_args()
+
+	logging.disable(logging.WARNING)
+	results = run(args.size, args.seed, args.funcs, args.tables, args.data, args.repeat)
+	base = None
+	if args.compare:
+		with open(args.compare) as f: base = json.load(f)
+		if base['rom'] != results['rom']: print('warning: compared results were taken on a different ROM')
+	report(results, base)
+	if args.output:
+		with open(args.output, 'w') as f: json.dump(results, f, indent = 2)
@@ -1,7 +1,13 @@
+import os
 import sys
 import re
+import json
+import hashlib
 from labeltool import labeltool
 
+# bump when the parsed fields or their meaning change, so old caches are ignored
+cache_version = 2
+
 class DCLReader:
 	def __init__(self, file_path):
 		self.file_path = file_path
@@ -70,14 +76,98 @@ class DCLReader:
 					mapping = parts[1]
 					if '.' in mapping: self.data_bit_labels[mapping] = bit_sym
 
+	def key(self):
+		# (path, mtime, SHA-256) of the DCL file, see load_cache()
+		with open(self.file_path, 'rb') as f: data = f.read()
+		return (os.path.abspath(self.file_path), os.stat(self.file_path).st_mtime_ns, hashlib.sha256(data).hexdigest())
+
+	def save_cache(self, file, key = None):
+		# Saves the parsed fields as JSON so load_cache() can restore them without parsing the DCL again
+		state = {
+			'version': cache_version,
+			'key': list(self.key() if key is None else key),
+			'data_labels': list(self.data_labels.items()),
+			'data_bit_labels': self.data_bit_labels,
+			'interrupts': list(self.interrupts.items()),
+			'romwin': self.romwin,
+		}
+		with open(f'{file}.tmp', 'w') as f: json.dump(state, f)
+		os.replace(f'{file}.tmp', file)
+
+	def load_cache(self, file):
+		# Restores the fields saved by save_cache(). The cache is valid if it was written by the same cache_version for the
+		# same path and mtime, or for a file with the same contents (e.g. after a copy or checkout).
+		# Returns False and leaves everything untouched otherwise, including when the cache is unreadable or malformed.
+		try:
+			with open(file) as f: state = json.load(f)
+			if type(state) != dict or state.get('version') != cache_version: return False
+			path, mtime, digest = state['key']
+			if path != os.path.abspath(self.file_path) or mtime != os.stat(self.file_path).st_mtime_ns:
+				if digest != self.key()[2]: return False
+			data_labels = {int(addr): str(name) for addr, name in state['data_labels']}
+			data_bit_labels = {str(mapping): str(name) for mapping, name in state['data_bit_labels'].items()}
+			interrupts = {int(addr): str(name) for addr, name in state['interrupts']}
+			romwin = int(state['romwin'])
+		except Exception: return False
+		self.data_labels = data_labels
+		self.data_bit_labels = data_bit_labels
+		self.interrupts = interrupts
+		self.romwin = romwin
+		return True
+
+	def parse_cached(self, cache_file = None):
+		# parse() through the cache at cache_file (DCL filename with .cache appended by default).
+		# Returns True if the cache was used. A cache that cannot be written is only skipped.
+		if cache_file is None: cache_file = f'{self.file_path}.cache'
+		if self.load_cache(cache_file): return True
+		key = self.key()
+		self.parse()
+		try: self.save_cache(cache_file, key)
+		except OSError: pass
+		return False
+
 	def save(self, out_path):
 		with open(out_path, 'w') as f: labeltool.save_labels(f, 0, {}, self.data_labels, self.data_bit_labels)
 		print(f'Done. {len(self.data_labels)} SFRs, {len(self.data_bit_labels)} bits')
 
+def convert(in_path, out_path, cache = True):
+	# batch worker: DCL file to label file, returns (SFR count, bit count)
+	reader = DCLReader(in_path)
+	if cache: reader.parse_cached()
+	else: reader.parse()
+	with open(out_path, 'w') as f: labeltool.save_labels(f, 0, {}, reader.data_labels, reader.data_bit_labels)
+	return len(reader.data_labels), len(reader.data_bit_labels)
+
+def convert_batch(in_dir, out_dir, workers = None, cache = True):
+	import concurrent.futures
+	files = sorted(file for file in os.listdir(in_dir) if file.lower().endswith('.dcl'))
+	os.makedirs(out_dir, exist_ok = True)
+	ok = True
+	with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+		futures = {pool.submit(convert, os.path.join(in_dir, file), os.path.join(out_dir, os.path.splitext(file)[0] + '.lbl'), cache): file for file in files}
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				sfrs, bits = future.result()
+				print(f'{futures[future]}: {sfrs} SFRs, {bits} bits')
+			except Exception as e:
+				print(f'{futures[future]}: {e}')
+				ok = False
+	print(f'Done. {len(files)} DCL files')
+	return ok
+
 if __name__ == '__main__':
-	if len(sys.argv) < 3:
-		print('Incorrect number of arguments')
-		sys.exit()
-	reader = DCLReader(sys.argv[1])
-	reader.parse()
-	reader.save(sys.argv[2])
+	import argparse
+	parser = argparse.ArgumentParser(description = 'Converts DCL files to label files.')
+	parser.add_argument('input', help = 'DCL file, or a directory whose DCL files are converted in parallel')
+	parser.add_argument('output', help = 'label file, or the output directory if input is a directory')
+	parser.add_argument('-j', '--jobs', type = int, help = 'number of worker processes for a directory (default: number of CPUs)')
+	parser.add_argument('--no-cache', action = 'store_true', help = 'do not load or save the parse cache (DCL filename with .cache appended)')
+	args = parser.parse_args()
+
+	if os.path.isdir(args.input):
+		if not convert_batch(args.input, args.output, args.jobs, not args.no_cache): sys.exit(1)
+	else:
+		reader = DCLReader(args.input)
+		if args.no_cache: reader.parse()
+		else: reader.parse_cached()
+		reader.save(args.output)
@@ -5,13 +5,25 @@ if __name__ == '__main__':
 
 from enum import IntEnum
 import os
+import gc
 import math
+import mmap
+import heapq
 import logging
+from array import array
+import json
+from collections import deque
+from collections.abc import MutableMapping
 try:
 	from colorama import init, Fore
 	has_colorama = True
 except ImportError: has_colorama = False
 
+try:
+	import numpy as np
+	has_numpy = True
+except ImportError: has_numpy = False
+
 if has_colorama: init(autoreset = True)
 GREEN = Fore.GREEN if has_colorama else ''
 RED = Fore.RED if has_colorama else ''
@@ -19,6 +31,14 @@ YELLOW = Fore.YELLOW if has_colorama else ''
 MAGENTA = Fore.MAGENTA if has_colorama else ''
 END = Fore.RESET if has_colorama else ''
 
+# Version of saved analysis states (see Disassembly.save_state). A saved state is reused as long as this and the inputs
+# match, so bump it whenever the traversal starts finding different results or the state format changes.
+cache_version = 4
+
+def map_file(file):
+	# Maps a file read-only into memory so it can be used as a region without copying.
+	with open(file, 'rb') as f: return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
 def conv_sign(value, bits): return value - (value >> (bits - 1)) * (2**bits)
 
 class numdisp(IntEnum):
@@ -32,7 +52,33 @@ class labeltype(IntEnum):
 	FUN = 0
 	LAB = 1
 
+class flowtype(IntEnum):
+	SEQ = 0      # falls through to the next instruction
+	COND = 1     # BC cond, Radr
+	JUMP = 2     # B Cadr, B ERn, BC AL
+	CALL = 3     # BL Cadr, BL ERn
+	RETURN = 4   # RT, RTI, POP PC
+	INVALID = 5  # not decodable, emitted as DW
+
+class traceevent(IntEnum):
+	JMPTABLE_CANDIDATE = 0  # load from a table followed by PUSH ERn or B/BL ERn
+	JMPTABLE_CONFIRMED = 1  # far table candidate reached __indru8 / POP PC
+	JMPTABLE_RESOLVED = 2   # table entries read, info: size, far
+	JMPTABLE_REJECTED = 3   # candidate dropped, or no valid entries
+	OVERLAP_REMOVED = 4     # code entry inside a longer instruction removed
+	LABEL_PROMOTED = 5      # existing label replaced by a function label, info: old, new
+	MID_INSTRUCTION = 6     # queue_add() refused an address inside an instruction
+
+class xreftype(IntEnum):
+	CALL = 0   # BL Cadr
+	JUMP = 1   # B Cadr, BC AL
+	COND = 2   # BC cond, Radr
+	TABLE = 3  # jump table entry, the source is the address of the entry
+	READ = 4   # L, TB
+	WRITE = 5  # ST, SB, RB
+
 class Register:
+	# Registers are immutable and shared; use get_register() instead of constructing new ones when decoding.
 	__reg_prefixes = {1: 'R', 2: 'ER', 4: 'XR', 8: 'QR'}
 	__reg_ptr_prefixes = {12: 'BP', 14: 'FP'}
 	__slots__ = ('size', 'n', 'ptr')
@@ -40,15 +86,20 @@ class Register:
 		if size not in self.__reg_prefixes.keys(): raise ValueError(f'invalid register size {size}')
 		super().__setattr__('size', size)
 		super().__setattr__('n', n & (-1 << int(math.log2(size))))
-		self.ptr = ptr
+		super().__setattr__('ptr', bool(ptr))
+
+	def format(self, ptr = None):
+		# ptr: show ER12/ER14 as BP/FP. Defaults to the register's own setting.
+		if ptr is None: ptr = self.ptr
+		return self.__reg_ptr_prefixes[self.n] if ptr and self.size == 2 and self.n in self.__reg_ptr_prefixes else f'{self.__reg_prefixes[self.size]}{self.n}'
 
 	def __repr__(self): return f'{type(self).__name__}(size={self.size}, n={self.n})'
-	def __str__(self): return self.__reg_ptr_prefixes[self.n] if self.ptr and self.size == 2 and self.n in self.__reg_ptr_prefixes else f'{self.__reg_prefixes[self.size]}{self.n}'
-	def __setattr__(self, name, value):
-		if name == 'ptr': super().__setattr__(name, value)
-		else: raise AttributeError(f"attribute '{name}' of '{type(self).__name__}' objects is not writable")
+	def __str__(self): return self.format()
+	def __setattr__(self, name, value): raise AttributeError(f"attribute '{name}' of '{type(self).__name__}' objects is not writable")
 
-	def __eq__(self, other): return isinstance(other, Register) and self.size == other.size and self.n == other.n
+	def __eq__(self, other): return self is other or (isinstance(other, Register) and self.size == other.size and self.n == other.n)
+	def __hash__(self): return hash((self.size, self.n))
+	def __reduce__(self): return (get_register, (self.size, self.n)) if self.ptr else (Register, (self.size, self.n, False))
 
 class ObjectBit:
 	__slots__ = ('obj', 'bit')
@@ -60,6 +111,7 @@ class ObjectBit:
 	def __repr__(self): return f'{type(self).__name__}(obj={self.obj}, bit={self.bit})'
 	def __str__(self): return f'{self.obj}.{self.bit}'
 	def __setattr__(self, name, value): raise AttributeError(f"attribute '{name}' of '{type(self).__name__}' objects is not writable")
+	def __reduce__(self): return (ObjectBit, (self.obj, self.bit))
 
 class Num:
 	__slots__ = ('bits', 'value', 'imm', 'disp', 'sign')
@@ -92,6 +144,7 @@ class Num:
 	def __setattr__(self, name, value):
 		if name in ('bits', 'value'): raise AttributeError(f"attribute '{name}' of '{type(self).__name__}' objects is not writable")
 		else: super().__setattr__(name, value)
+	def __reduce__(self): return (Num, (self.bits, self.value, self.imm, self.sign), (None, {'disp': self.disp}))
 
 class Pointer:
 	__slots__ = ('disp', 'register')
@@ -102,8 +155,9 @@ class Pointer:
 		self.register = register
 		self.disp = disp
 
+	def format(self, ptr = None): return f'{"" if self.disp is None else self.disp}[{self.register.format(ptr) if type(self.register) == Register else self.register}]'
 	def __repr__(self): return f'{type(self).__name__}(register={repr(self.register)}, disp={repr(self.disp)})'
-	def __str__(self): return f'{"" if self.disp is None else self.disp}[{self.register}]'
+	def __str__(self): return self.format()
 
 class Address:
 	__slots__ = ('addr', 'seg')
@@ -140,7 +194,21 @@ class BitOffset:
 	def __repr__(self): return f'{type(self).__name__}(item={self.item}, bit={self.bit})'
 	def __str__(self): return f'{self.item}.{self.bit}'
 
-def RegHandler(self, flags, value): return Register(flags & 0xf, value)
+_registers = {size: tuple(Register(size, n) for n in range(16)) for size in (1, 2, 4, 8)}
+def get_register(size, n): return _registers[size][n]
+
+_cond_names = ('GE', 'LT', 'GT', 'LE', 'GES', 'LTS', 'GTS', 'LES', 'NE', 'EQ', 'NV', 'OV', 'PS', 'NS', 'AL')
+_regctrl_names = {0: 'ECSR', 1: 'ELR', 2: 'PSW', 3: 'EPSW', 4: 'SP', 6: 'DSR'}
+
+def _reglist(value, bits):
+	return tuple(name for bit, name in bits if value & bit)
+_push_lists = tuple(_reglist(value, ((2, 'ELR'), (4, 'EPSW'), (8, 'LR'), (1, 'EA'))) for value in range(16))
+_pop_lists = tuple(_reglist(value, ((1, 'EA'), (8, 'LR'), (4, 'PSW'), (2, 'PC'))) for value in range(16))
+
+# register file snapshots are immutable 16-byte strings (R0-R15), so queued addresses can share them without copying
+_zero_regs = bytes(16)
+
+def RegHandler(self, flags, value): return _registers[flags & 0xf][value]
 
 def NumHandler(self, flags, value): return Num(flags, value)
 
@@ -151,14 +219,7 @@ def ShiftNumHandler(self, flags, value):
 	n.disp = numdisp.DEC
 	return n
 
-def RegCtrlHandler(self, flags, value):
-	flags &= 0xf
-	if flags == 0: return 'ECSR'
-	elif flags == 1: return 'ELR'
-	elif flags == 2: return 'PSW'
-	elif flags == 3: return 'EPSW'
-	elif flags == 4: return 'SP'
-	elif flags == 6: return 'DSR'
+def RegCtrlHandler(self, flags, value): return _regctrl_names.get(flags & 0xf)
 
 def MemHandler(self, flags, value):
 	s = (flags >> 12) & 0xf
@@ -173,54 +234,547 @@ def MemHandler(self, flags, value):
 	if r == 0 and disp is not None: return Address(disp.value)
 	elif r > 0:
 		if r == 1: reg = 'EA'
-		elif r == 2: reg = Register(2, value)
-		elif r == 3: reg = Register(2, 12)
-		elif r == 4: reg = Register(2, 14)
+		elif r == 2: reg = _registers[2][value]
+		elif r == 3: reg = _registers[2][12]
+		elif r == 4: reg = _registers[2][14]
 		return Pointer(reg, disp)
 
 	raise RuntimeError
 
 def CondHandler(self, flags, value):
-	if value == 0: return 'GE'
-	elif value == 1: return 'LT'
-	elif value == 2: return 'GT'
-	elif value == 3: return 'LE'
-	elif value == 4: return 'GES'
-	elif value == 5: return 'LTS'
-	elif value == 6: return 'GTS'
-	elif value == 7: return 'LES'
-	elif value == 8: return 'NE'
-	elif value == 9: return 'EQ'
-	elif value == 0xa: return 'NV'
-	elif value == 0xb: return 'OV'
-	elif value == 0xc: return 'PS'
-	elif value == 0xd: return 'NS'
-	elif value == 0xe: return 'AL'
-
-	raise RuntimeError
+	if value >= len(_cond_names): raise RuntimeError
+	return _cond_names[value]
 
 def CadrHandler(self, flags, value): return Address(self.fetch(), value)
 def RadrHandler(self, flags, value): return Address((self.pc+conv_sign(value, 8)*2) & 0xfffe, self.pc >> 16)
 
+# register lists are returned as new lists, each instruction owns its operand lists
 def PushHandler(self, flags, value):
-	regs = []
-	if value & 2: regs.append('ELR')
-	if value & 4: regs.append('EPSW')
-	if value & 8: regs.append('LR')
-	if value & 1: regs.append('EA')
-
+	regs = _push_lists[value & 0xf]
 	if len(regs) == 0: raise RuntimeError
-	return regs
+	return list(regs)
 
 def PopHandler(self, flags, value):
-	regs = []
-	if value & 1: regs.append('EA')
-	if value & 8: regs.append('LR')
-	if value & 4: regs.append('PSW')
-	if value & 2: regs.append('PC')
-
+	regs = _pop_lists[value & 0xf]
 	if len(regs) == 0: raise RuntimeError
-	return regs
+	return list(regs)
+
+def build_decode_table(instrs_dsr, instrs):
+	# Compiles the instruction tables into a 65536-entry lookup indexed by instruction word.
+	# Each entry is (instr, dsr, op0 value, op1 value, opcode id) for the first matching table entry, or None.
+	# The opcode id is the entry's position in instrs_dsr + instrs.
+	table = [None]*0x10000
+	i = -1
+	for instr_list, dsr in ((instrs_dsr, True), (instrs, False)):
+		for _instr in instr_list:
+			i += 1
+			ops = _instr[2:3] if dsr else _instr[2:4]
+			mask = 0
+			for op in ops:
+				if op is not None: mask |= op[0]
+			if _instr[1] & mask: continue
+			sub = mask
+			while True:
+				word = _instr[1] | sub
+				if table[word] is None:
+					vals = [None if op is None else (word & op[0]) >> op[1] for op in ops]
+					if dsr: vals.append(None)
+					table[word] = (_instr, dsr, vals[0], vals[1], i)
+				if sub == 0: break
+				sub = (sub - 1) & mask
+	return table
+
+def build_predecode_luts(decode_table):
+	# Derives per-word lookup tables from a decode table: opcode id (-1 if invalid),
+	# instruction length in words including Disp16/Cadr extension words, DSR prefix flag and flow type.
+	index = array('h', [-1])*0x10000
+	length = bytearray([1])*0x10000
+	dsr = bytearray(0x10000)
+	flow = bytearray([flowtype.INVALID])*0x10000
+	for word, entry in enumerate(decode_table):
+		if entry is None: continue
+		_instr, is_dsr, op0, op1, opcode = entry
+		if is_dsr:
+			index[word] = opcode
+			dsr[word] = 1
+			flow[word] = flowtype.SEQ
+			continue
+
+		ops = [(op, value) for op, value in ((_instr[2], op0), (_instr[3], op1)) if op is not None]
+		kind = flowtype.SEQ
+		words = 1
+		for op, value in ops:
+			handler = op[3]
+			if handler == CondHandler and value == 0xf: kind = flowtype.INVALID
+			elif handler in (PushHandler, PopHandler) and value & 0xf == 0: kind = flowtype.INVALID
+			elif handler == CadrHandler: words += 1
+			elif handler == MemHandler and (op[2] >> 8) & 0xf == 1 and not ((op[2] >> 12) & 8 and op[2] & 0xf == 1): words += 1
+		if kind == flowtype.INVALID: continue
+
+		name = _instr[0]
+		if name == 'BC': kind = flowtype.JUMP if op0 == 0xe else flowtype.COND
+		elif name == 'B': kind = flowtype.JUMP
+		elif name == 'BL': kind = flowtype.CALL
+		elif name in ('RT', 'RTI') or (name == 'POP' and ops[0][0][3] == PopHandler and op0 & 2): kind = flowtype.RETURN
+
+		index[word] = opcode
+		length[word] = words
+		flow[word] = kind
+	return index, bytes(length), bytes(dsr), bytes(flow)
+
+class PreDecode:
+	# Per-word classification of one code region. Element i describes the word at start + i*2.
+	# Arrays are NumPy arrays when NumPy is available, otherwise array.array objects with the same contents.
+	__slots__ = ('start', 'index', 'length', 'dsr', 'flow')
+	def __init__(self, start, view, luts, use_numpy = has_numpy):
+		index, length, dsr, flow = luts
+		self.start = start
+		view = view[:len(view) & ~1]
+		if use_numpy:
+			words = np.frombuffer(view, dtype = '<u2')
+			self.index = np.frombuffer(index, dtype = np.int16)[words]
+			self.length = np.frombuffer(length, dtype = np.uint8)[words]
+			self.dsr = np.frombuffer(dsr, dtype = np.uint8)[words]
+			self.flow = np.frombuffer(flow, dtype = np.uint8)[words]
+		else:
+			words = array('H')
+			words.frombytes(view)
+			if sys.byteorder == 'big': words.byteswap()
+			self.index = array('h', map(index.__getitem__, words))
+			self.length = array('B', map(length.__getitem__, words))
+			self.dsr = array('B', map(dsr.__getitem__, words))
+			self.flow = array('B', map(flow.__getitem__, words))
+
+	def __len__(self): return len(self.index)
+	def __repr__(self): return f'{type(self).__name__}(start={self.start:05X}H, words={len(self.index)})'
+
+# (predecode LUTs, start bitmap, continuation bitmap, use NumPy) for sweep_worker(), set once per worker process
+sweep_ctx = None
+
+def sweep_init(ctx):
+	global sweep_ctx
+	sweep_ctx = ctx
+
+def sweep_worker(start, data):
+	# Linear sweep over one piece of a region (at most one segment), see Disassembly.sweep().
+	# Returns the start addresses of the runs found, in address order.
+	luts, starts, cont, use_numpy = sweep_ctx
+	p = PreDecode(start, memoryview(data), luts, use_numpy)
+	length = p.length.tolist() if use_numpy else p.length
+	dsr = p.dsr.tolist() if use_numpy else p.dsr
+	flow = p.flow.tolist() if use_numpy else p.flow
+	def bit(bitmap, i):
+		h = (start >> 1) + i
+		return bitmap[h >> 3] >> (h & 7) & 1
+	roots = []
+	n = len(flow)
+	run = None
+	# the start of a segment is a boundary like the end of known code or padding, except in segment 0 which starts with the vector table
+	boundary = start >= 0x10000
+	i = 0
+	while i < n:
+		if bit(starts, i):
+			# known code: a run falling through into it is kept, and its end is a boundary
+			if run is not None: roots.append(start + run*2)
+			run = None
+			i += 1
+			while i < n and bit(cont, i) and not bit(starts, i): i += 1
+			boundary = True
+			continue
+		if not bit(cont, i) and data[i*2] == 0xff and data[i*2+1] == 0xff:
+			# padding
+			run = None
+			boundary = True
+			i += 1
+			continue
+		if bit(cont, i) or not boundary:
+			run = None
+			boundary = False
+			i += 1
+			continue
+		k = i
+		while k < n - 1 and dsr[k]: k += 1
+		size = k - i + length[k]
+		if flow[k] == flowtype.INVALID or dsr[k] or i + size > n or any(bit(starts, j) or bit(cont, j) for j in range(i + 1, i + size)):
+			run = None
+			boundary = False
+			i += 1
+			continue
+		if run is None: run = i
+		i += size
+		if flow[k] in (flowtype.RETURN, flowtype.JUMP):
+			roots.append(start + run*2)
+			run = None
+	return roots
+
+class Trace:
+	# Typed trace events from Disassembly. Set Disassembly.trace to an instance to record them; with the default of None
+	# no event is built at all. The last `size` events are kept in a ring buffer, and sink is called with every event.
+	# Events are (traceevent, pc, addr, info) tuples; pc is the instruction that caused the event, or None.
+	__slots__ = ('events', 'sink')
+
+	def __init__(self, size = 4096, sink = None):
+		self.events = deque(maxlen = size)
+		self.sink = sink
+
+	def emit(self, event, pc, addr, **info):
+		record = (event, pc, addr, info)
+		self.events.append(record)
+		if self.sink is not None: self.sink(record)
+
+	@staticmethod
+	def to_json(record):
+		event, pc, addr, info = record
+		return json.dumps({'event': traceevent(event).name.lower(), 'pc': pc, 'addr': addr, **info})
+
+	def dump(self, f):
+		# Writes the buffered events as JSON lines.
+		for record in self.events: f.write(self.to_json(record) + '\n')
+
+	def __len__(self): return len(self.events)
+	def __repr__(self): return f'{type(self).__name__}(events={len(self.events)})'
+
+class XrefMap:
+	# Target address -> references to it, each stored as source << 3 | xreftype in an unsigned int array.
+	__slots__ = ('__refs',)
+	def __init__(self): self.__refs = {}
+
+	def add(self, target, source, kind):
+		refs = self.__refs.get(target)
+		if refs is None: refs = self.__refs[target] = array('I')
+		refs.append(source << 3 | kind)
+
+	def remove(self, target, source, kind):
+		refs = self.__refs.get(target)
+		if refs is None or source << 3 | kind not in refs: return
+		refs.remove(source << 3 | kind)
+		if not refs: del self.__refs[target]
+
+	def get(self, target):
+		# [(source, xreftype)] in the order the references were found
+		refs = self.__refs.get(target)
+		return [] if refs is None else [(ref >> 3, xreftype(ref & 7)) for ref in refs]
+
+	def count(self, target):
+		refs = self.__refs.get(target)
+		return 0 if refs is None else len(refs)
+
+	def __contains__(self, target): return target in self.__refs
+	def __iter__(self): return iter(self.__refs)
+	def __len__(self): return len(self.__refs)
+	def __getstate__(self): return self.__refs
+	def __setstate__(self, state): self.__refs = state
+	def __repr__(self): return f'{type(self).__name__}(targets={len(self.__refs)})'
+
+def instr_xrefs(instr):
+	# (target, xreftype, is data) for the direct code or data reference made by a decoded instruction, if any
+	op = instr[0]
+	if len(instr) < 2: return ()
+	last = instr[-1]
+	if op in ('B', 'BL', 'BC'):
+		if type(last) != Address: return ()
+		if op == 'BL': return ((last.get_combined() & 0xffffe, xreftype.CALL, False),)
+		return ((last.get_combined(), xreftype.COND if op == 'BC' and instr[1] != 'AL' else xreftype.JUMP, False),)
+	if op in ('L', 'ST', 'SB', 'TB', 'RB'):
+		if type(last) == Address: target = last.addr.value
+		elif type(last) == DSRPrefix and type(last.dsr) == Num and type(last.item) == Address: target = (last.dsr.value << 16) | last.item.addr.value
+		elif type(last) == BitOffset and type(last.item) == Address: target = last.item.addr.value
+		else: return ()
+		return ((target, xreftype.READ if op in ('L', 'TB') else xreftype.WRITE, True),)
+	return ()
+
+class WorkQueue:
+	# LIFO worklist of (address, register snapshot) pairs with O(1) membership and removal.
+	# Pushing an address that is already queued moves it to the top with the new snapshot.
+	__slots__ = ('__items', 'peak')
+	def __init__(self):
+		self.__items = {}
+		self.peak = 0
+
+	def push(self, addr, r):
+		self.__items.pop(addr, None)
+		self.__items[addr] = r
+		if len(self.__items) > self.peak: self.peak = len(self.__items)
+
+	def pop(self): return self.__items.popitem()
+	def remove(self, addr): self.__items.pop(addr, None)
+	def clear(self): self.__items.clear()
+
+	def __len__(self): return len(self.__items)
+	def __contains__(self, addr): return addr in self.__items
+	def __repr__(self): return f'{type(self).__name__}(size={len(self.__items)}, peak={self.peak})'
+
+class WordFetcher:
+	# Minimal stand-in for Disassembly when re-running operand handlers over stored instruction words.
+	__slots__ = ('pc', 'words', 'i')
+	def __init__(self, pc, words):
+		self.pc = pc
+		self.words = words
+		self.i = 0
+
+	def fetch(self):
+		a = self.words[self.i]
+		self.i += 1
+		self.pc += 2
+		return a
+
+def rebuild_instr(decode_table, addr, words, unsigned = False):
+	# Rebuilds the operand list the traversal produced for a regular (non-split) code entry from its raw words.
+	f = WordFetcher(addr, words)
+	dsr_src = None
+	instr_bytes = f.fetch()
+	entry = decode_table[instr_bytes]
+	while entry is not None and entry[1]:
+		_instr = entry[0]
+		dsr_src = _instr[2][3](f, _instr[2][2], entry[2])
+		if type(dsr_src) == Num: dsr_src.imm = False
+		instr_bytes = f.fetch()
+		entry = decode_table[instr_bytes]
+	try:
+		if entry is None: raise RuntimeError
+		_instr, _, op0, op1, _ = entry
+		instr = [_instr[0]]
+		if _instr[2] is not None: instr.append(_instr[2][3](f, _instr[2][2], op0))
+		if _instr[3] is not None: instr.append(_instr[3][3](f, _instr[3][2], op1))
+		if instr[0] in ('SB', 'TB', 'RB'): instr[1] = BitOffset(instr[1], instr[2].value); instr.pop(2)
+		if len(instr) > 1 and type(instr[-1]) in (Address, Pointer) and _instr[len(instr)][3] == MemHandler and dsr_src is not None:
+			instr[-1] = DSRPrefix(dsr_src, instr[-1])
+	except RuntimeError: instr = ['DW', Num(16, instr_bytes, False)]
+
+	if instr[0] in ('AND', 'OR', 'XOR') and type(instr[2]) == Num:
+		instr[2].sign = False
+		instr[2].disp = numdisp.BIN
+	if unsigned and len(instr) > 2 and type(instr[2]) == Num: instr[2].sign = False
+	if instr[0] == 'EXTBW': del instr[2]
+	return instr
+
+def encode_operand(x):
+	# JSON form of an instruction operand for saved states: plain strings and numbers as-is, objects as tagged lists
+	if type(x) in (str, int) or x is None: return x
+	elif type(x) == list: return ['L', x]
+	elif type(x) == Register: return ['R', x.size, x.n, x.ptr]
+	elif type(x) == Num: return ['N', x.bits, x.value, x.imm, x.sign, int(x.disp)]
+	elif type(x) == Pointer: return ['P', encode_operand(x.register), encode_operand(x.disp)]
+	elif type(x) == Address: return ['A', encode_operand(x.addr), encode_operand(x.seg)]
+	elif type(x) == DSRPrefix: return ['D', encode_operand(x.dsr), encode_operand(x.item)]
+	elif type(x) == BitOffset: return ['B', encode_operand(x.item), x.bit]
+	elif type(x) == ObjectBit: return ['O', encode_operand(x.obj), x.bit]
+	raise TypeError(f'cannot encode operand of type {type(x).__name__}')
+
+def decode_operand(x):
+	if type(x) != list: return x
+	tag = x[0]
+	if tag == 'L': return list(x[1])
+	elif tag == 'R': return get_register(x[1], x[2]) if x[3] else Register(x[1], x[2], False)
+	elif tag == 'N':
+		num = Num(x[1], x[2], x[3], x[4])
+		num.disp = numdisp(x[5])
+		return num
+	elif tag == 'P': return Pointer(decode_operand(x[1]), decode_operand(x[2]))
+	elif tag == 'A':
+		addr = Address.__new__(Address)
+		addr.addr = decode_operand(x[1])
+		addr.seg = decode_operand(x[2])
+		return addr
+	elif tag == 'D': return DSRPrefix(decode_operand(x[1]), decode_operand(x[2]))
+	elif tag == 'B':
+		bit = BitOffset.__new__(BitOffset)
+		bit.item = decode_operand(x[1])
+		bit.bit = x[2]
+		return bit
+	elif tag == 'O': return ObjectBit(decode_operand(x[1]), x[2])
+	raise ValueError(f'unknown operand tag {tag!r}')
+
+# operand types that are mutable and so must not be shared between code entries
+mutable_operands = (list, Num, Address, Pointer, DSRPrefix, BitOffset, ObjectBit)
+
+def clone_operand(x):
+	# Copies an operand without going through the checking constructors. Strings and registers are immutable and shared.
+	t = type(x)
+	if t == list: return x.copy()
+	elif t == Num:
+		num = object.__new__(Num)
+		object.__setattr__(num, 'bits', x.bits)
+		object.__setattr__(num, 'value', x.value)
+		object.__setattr__(num, 'imm', x.imm)
+		object.__setattr__(num, 'disp', x.disp)
+		object.__setattr__(num, 'sign', x.sign)
+		return num
+	elif t == Address:
+		addr = object.__new__(Address)
+		addr.addr = clone_operand(x.addr)
+		addr.seg = None if x.seg is None else clone_operand(x.seg)
+		return addr
+	elif t == Pointer:
+		ptr = object.__new__(Pointer)
+		ptr.register = x.register
+		ptr.disp = None if x.disp is None else clone_operand(x.disp)
+		return ptr
+	elif t == DSRPrefix:
+		dsr = object.__new__(DSRPrefix)
+		dsr.dsr = clone_operand(x.dsr)
+		dsr.item = clone_operand(x.item)
+		return dsr
+	elif t == BitOffset:
+		bit = object.__new__(BitOffset)
+		bit.item = clone_operand(x.item)
+		bit.bit = x.bit
+		return bit
+	elif t == ObjectBit: return ObjectBit(clone_operand(x.obj), x.bit)
+	return x
+
+class CodeStore(MutableMapping):
+	# Columnar alternative to the Disassembly.code dict. Regular entries are kept as raw words in parallel
+	# arrays (address, opcode id, length, flags, word offset) and their [instrl, instr] lists are rebuilt
+	# on access, so modifying a returned entry does not change the store. Entries that cannot be rebuilt
+	# from their words alone (split DSR prefix entries, odd or out-of-range addresses) are kept as-is.
+	# Iteration is always in address order.
+	__slots__ = ('__table', '__rows', '__addr', '__opcode', '__length', '__flags', '__woff', '__words', '__exact', '__pending', '__count', '__lo', '__hi')
+	F_UNSIGNED = 1
+
+	def __init__(self, decode_table):
+		self.__table = decode_table
+		self.__rows = array('i', [-1])*0x80000
+		self.__addr = array('I')
+		self.__opcode = array('h')
+		self.__length = array('B')
+		self.__flags = array('B')
+		self.__woff = array('I')
+		self.__words = array('H')
+		self.__exact = {}
+		self.__pending = None
+		self.__count = 0
+		self.__lo = 0x80000
+		self.__hi = 0
+
+	@staticmethod
+	def regular(addr, instrl):
+		# whether an entry at addr with these words can be kept as raw words
+		return not addr & 1 and 0 <= addr < 0x100000 and 0 < len(instrl) <= 0xff
+
+	def __encode(self, addr, entry):
+		instrl, instr = entry
+		if not self.regular(addr, instrl): self.__exact[addr] = entry
+		else: self.__append(addr, instrl, self.F_UNSIGNED if len(instr) > 2 and type(instr[2]) == Num and not instr[2].sign else 0)
+
+	def __append(self, addr, instrl, flags):
+		self.__rows[addr >> 1] = len(self.__addr)
+		if addr >> 1 < self.__lo: self.__lo = addr >> 1
+		if addr >> 1 >= self.__hi: self.__hi = (addr >> 1) + 1
+		self.__addr.append(addr)
+		self.__opcode.append(self.__opcode_of(instrl))
+		self.__length.append(len(instrl))
+		self.__flags.append(flags)
+		self.__woff.append(len(self.__words))
+		self.__words.extend(instrl)
+
+	def __flush(self):
+		if self.__pending is not None:
+			addr, entry = self.__pending
+			self.__pending = None
+			self.__encode(addr, entry)
+
+	def __discard(self, addr):
+		if self.__pending is not None and self.__pending[0] == addr:
+			self.__pending = None
+		elif addr in self.__exact: del self.__exact[addr]
+		elif not addr & 1 and 0 <= addr < 0x100000 and self.__rows[addr >> 1] >= 0: self.__rows[addr >> 1] = -1
+		else: return False
+		self.__count -= 1
+		return True
+
+	def __setitem__(self, addr, entry):
+		# The newest entry is kept live until the next store, as the traversal may still adjust its operands.
+		self.__discard(addr)
+		self.__flush()
+		self.__pending = (addr, entry)
+		self.__count += 1
+
+	def set_exact(self, addr, entry):
+		self.__discard(addr)
+		self.__flush()
+		self.__exact[addr] = entry
+		self.__count += 1
+
+	def set_words(self, addr, instrl, unsigned = False):
+		# Stores a regular entry from its instruction words alone, without building its operands.
+		if not self.regular(addr, instrl): raise ValueError(f'entry at {addr:05X}H cannot be rebuilt from its words')
+		self.__discard(addr)
+		self.__flush()
+		self.__append(addr, instrl, self.F_UNSIGNED if unsigned else 0)
+		self.__count += 1
+
+	def raw(self, addr):
+		# (words, unsigned) of a regular entry without rebuilding its operands, or None for an entry kept as-is.
+		self.__flush()
+		if addr in self.__exact: return None
+		row = self.__row(addr)
+		if row < 0: raise KeyError(addr)
+		off = self.__woff[row]
+		return self.__words[off:off+self.__length[row]].tolist(), bool(self.__flags[row] & self.F_UNSIGNED)
+
+	def __getitem__(self, addr):
+		if self.__pending is not None and self.__pending[0] == addr: return self.__pending[1]
+		if addr in self.__exact: return self.__exact[addr]
+		row = self.__row(addr)
+		if row < 0: raise KeyError(addr)
+		off = self.__woff[row]
+		words = self.__words[off:off+self.__length[row]].tolist()
+		return [words, rebuild_instr(self.__table, addr, words, self.__flags[row] & self.F_UNSIGNED)]
+
+	def __row(self, addr):
+		if type(addr) != int or addr & 1 or not 0 <= addr < 0x100000: return -1
+		return self.__rows[addr >> 1]
+
+	def __delitem__(self, addr):
+		if not self.__discard(addr): raise KeyError(addr)
+
+	def __contains__(self, addr):
+		return (self.__pending is not None and self.__pending[0] == addr) or addr in self.__exact or self.__row(addr) >= 0
+
+	def __len__(self): return self.__count
+
+	def __iter__(self):
+		self.__flush()
+		it = (i << 1 for i, row in enumerate(self.__rows[self.__lo:self.__hi], self.__lo) if row >= 0)
+		if not self.__exact: return it
+		return heapq.merge(it, sorted(self.__exact))
+
+	def length(self, addr):
+		# Number of instruction words at addr without rebuilding its operands.
+		if self.__pending is not None and self.__pending[0] == addr: return len(self.__pending[1][0])
+		if addr in self.__exact: return len(self.__exact[addr][0])
+		row = self.__row(addr)
+		if row < 0: raise KeyError(addr)
+		return self.__length[row]
+
+	def __opcode_of(self, instrl):
+		i = 0
+		while i < len(instrl) - 1 and self.__table[instrl[i]] is not None and self.__table[instrl[i]][1]: i += 1
+		e = self.__table[instrl[i]] if instrl else None
+		return -1 if e is None else e[4]
+
+	def opcode(self, addr):
+		# Opcode id (position in the instruction tables) of the instruction at addr, or -1 if not decodable.
+		if self.__pending is not None and self.__pending[0] == addr: return self.__opcode_of(self.__pending[1][0])
+		if addr in self.__exact: return self.__opcode_of(self.__exact[addr][0])
+		row = self.__row(addr)
+		if row < 0: raise KeyError(addr)
+		return self.__opcode[row]
+
+	def __repr__(self): return f'{type(self).__name__}(size={self.__count})'
+
+	# Pickling leaves out the decode table; bind() it again after unpickling.
+	def __getstate__(self):
+		self.__flush()
+		return (self.__rows, self.__addr, self.__opcode, self.__length, self.__flags, self.__woff, self.__words, self.__exact, self.__count, self.__lo, self.__hi)
+
+	def __setstate__(self, state):
+		self.__rows, self.__addr, self.__opcode, self.__length, self.__flags, self.__woff, self.__words, self.__exact, self.__count, self.__lo, self.__hi = state
+		self.__table = None
+		self.__pending = None
+
+	def bind(self, decode_table): self.__table = decode_table
 
 class Disassembly:
 	__instrs_dsr = [
@@ -398,22 +952,45 @@ class Disassembly:
 		['ICESWI',	0xfeff,	None,									None],  # Triggers emulator software interrupt
 	]
 
-	def __init__(self, code_bytes = None, pad_word = 0xffff, romwin = 0x8000):
-		self.code = {}
+	__decode_table = build_decode_table(__instrs_dsr, __instrs)
+	__predecode_luts = None
+
+	def __init__(self, code_bytes = None, pad_word = 0xffff, romwin = 0x8000, compact = False):
+		self.code = CodeStore(self.__decode_table) if compact else {}
 		self.conds = []
 		self.labels = {}
 		self.data_labels = {}
+		# code -> code (calls, jumps, jump table entries) and code -> data (loads, stores, bit ops) references
+		self.xrefs_code = XrefMap()
+		self.xrefs_data = XrefMap()
 		self.filename = ''
 		
 		self.__regions = []
+		self.__pages = [()]*16
+		self.__max = 0
 		if code_bytes is not None: self.add_region(0, code_bytes)
 		self.__romwin = romwin
 		self.__pad_word = pad_word
 		self.pc = 0
-		self.r = [0]*16
+		self.r = _zero_regs
+		# distinct register snapshots, so equal states share one object
+		self.__regstates = {_zero_regs: _zero_regs}
 		self.jump_tables = {}
-		self.__queue = []
-		self.__queueregs = []
+		self.__queue = WorkQueue()
+		self.__new_code = set()
+		# dict mode: addresses of entries that cannot be rebuilt from their words (CodeStore keeps track of these itself)
+		self.__exact_code = set()
+		# one bit per halfword of code memory: code entry starts, and the words after a start that belong to its entry.
+		# kept up to date with self.code by __set_code(), together with the lowest and highest entry address
+		self.__starts = bytearray(0x10000)
+		self.__cont = bytearray(0x10000)
+		self.__code_lo = 0x100000
+		self.__code_hi = -1
+		self.trace = None
+		# called as progress(self) every 4096 instructions; returning True stops disassemble() early, see there
+		self.progress = None
+		# running totals over all disassemble() calls
+		self.counters = dict.fromkeys(('words_fetched', 'decode_calls', 'queue_pushes', 'dedupe_hits', 'mid_instruction_rejects', 'jump_tables_found', 'overlap_removals'), 0)
 		self.__jump_tables = []
 		self.__jump_tablesregs = []
 		self.__instrl = []
@@ -423,8 +1000,7 @@ class Disassembly:
 	def get_r(self, size, n):
 		if size not in (1, 2, 4, 8): raise ValueError('invalid size')
 		if n % size != 0: raise ValueError('invalid register for specified size')
-		val = 0
-		for i in range(size-1, -1, -1): val = val << 8 | self.r[n+i]
+		val = int.from_bytes(self.r[n:n+size], 'little')
 		#print(f'{self.pc-2:05X}: read {Register(size, n)} = 0x{val:x}')
 		return val
 
@@ -434,11 +1010,12 @@ class Disassembly:
 		if size not in (1, 2, 4, 8): raise ValueError('invalid size')
 		if value < 0 or value >= 2**8**size: raise ValueError('invalid value for specified size')
 		if n % size != 0: raise ValueError('invalid register for specified size')
-		for i in range(size):
-			self.r[n+i] = value & 0xff
-			value >>= 8
+		r = self.r[:n] + value.to_bytes(size, 'little') + self.r[n+size:]
+		self.r = self.__regstates.setdefault(r, r)
 
 	def disassemble(self):
+		# Returns True once the queue is exhausted. If the progress callback asks to stop, returns False with the code
+		# found so far in order and the remaining addresses still queued, so a later call picks up where this one stopped.
 		if not len(self.__regions): raise ValueError('no code regions loaded')
 
 		if not self.__disas:
@@ -452,36 +1029,48 @@ class Disassembly:
 		instr = ['', '', '']
 		prev_instr = ['', '', '']
 		dsr_src = None
+		prefixed = False
+		stale_dsr = False
 		possible_jmp_table_adrs = None
+		trace = self.trace
+		debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+		progress = self.progress
+		steps = 0
+		done = True
 
 		while len(self.__queue) > 0:
+			if progress is not None:
+				steps += 1
+				if steps & 0xfff == 0 and progress(self):
+					done = False
+					break
 			prev_instr = instr
 
-			self.pc = self.__queue.pop()
-			self.r = self.__queueregs.pop().copy()
-			while self.pc in self.__queue:
-				idx = self.__queue.index(self.pc)
-				self.__queue.pop(idx)
-				self.__queueregs.pop(idx)
+			self.pc, self.r = self.__queue.pop()
 			instr_bytes = self.fetch()
+			self.counters['decode_calls'] += 1
 			try:
-				_instr, dsr = self.decode(instr_bytes)
+				entry = self.__decode_table[instr_bytes]
+				if entry is None: raise RuntimeError
+				_instr, dsr, op0, op1, _ = entry
 				if dsr:
 					if _instr[2][3] == RegCtrlHandler: instr = ['EDSR']
 					else: instr = ['DW', Num(16, instr_bytes, False)]
-					dsr_src = _instr[2][3](self, _instr[2][2], (instr_bytes & _instr[2][0]) >> _instr[2][1])
+					dsr_src = _instr[2][3](self, _instr[2][2], op0)
 					if type(dsr_src) == Num: dsr_src.imm = False
+					prefixed = True
 					self.queue_add(self.pc)
 					continue
 				else:
 					instr = [_instr[0]]
-					if _instr[2] is not None: instr.append(_instr[2][3](self, _instr[2][2], (instr_bytes & _instr[2][0]) >> _instr[2][1]))
-					if _instr[3] is not None: instr.append(_instr[3][3](self, _instr[3][2], (instr_bytes & _instr[3][0]) >> _instr[3][1]))
+					if _instr[2] is not None: instr.append(_instr[2][3](self, _instr[2][2], op0))
+					if _instr[3] is not None: instr.append(_instr[3][3](self, _instr[3][2], op1))
 					if instr[0] == 'BC': self.conds.append(self.pc-2)
 					if instr[0] in ('SB', 'TB', 'RB'): instr[1] = BitOffset(instr[1], instr[2].value); instr.pop(2)
 					if len(instr) > 1 and type(instr[-1]) in (Address, Pointer) and _instr[len(instr)][3] == MemHandler and dsr_src is not None:
 						instr[-1] = DSRPrefix(dsr_src, instr[-1])
 						dsr_src = None
+						if not prefixed: stale_dsr = True
 					if len(instr) > 1 and instr[0] in ('L', 'ST', 'SB', 'TB', 'RB'):
 						if type(instr[-1]) == Address:
 							addr = instr[-1].addr.value
@@ -512,34 +1101,52 @@ class Disassembly:
 				instr[2].disp = numdisp.BIN
 
 			ins_len = len(self.__instrl)*2
-			if dsr_src is None: self.code[self.pc-ins_len] = [self.__instrl, instr]
+			if dsr_src is None: self.__set_code(self.pc-ins_len, [self.__instrl, instr], stale_dsr)
 			else:
 				if len(self.__instrl) == 0: logging.warning(f'{GREEN}{self.pc-ins_len:05X}: {END}No instruction words were assigned to code at address {YELLOW}{self.pc-ins_len:05X}{END}')
-				self.code[self.pc-ins_len] = [[self.__instrl[0]], prev_instr]
+				self.__set_code(self.pc-ins_len, [[self.__instrl[0]], prev_instr], True)
 				if len(self.__instrl) < 2: logging.warning(f'{GREEN}{self.pc-ins_len:05X}: {END}No instruction words were assigned to code at address {YELLOW}{self.pc-ins_len+2:05X}{END}')
-				self.code[self.pc-ins_len+2] = [self.__instrl[1:], instr]
+				self.__set_code(self.pc-ins_len+2, [self.__instrl[1:], instr], True)
 
 			mid_addr = self.pc-ins_len + (2 if dsr_src is None else 4)
+			# mid_addr - 2 is the entry holding instr
+			for target, kind, data in instr_xrefs(instr): (self.xrefs_data if data else self.xrefs_code).add(target, mid_addr - 2, kind)
 			if ins_len == (4 if dsr_src is None else 6) and mid_addr in self.code:
-				logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Removed address {YELLOW}{mid_addr:05X} from disassembly and labels{END}')
+				if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Removed address {YELLOW}{mid_addr:05X} from disassembly and labels{END}')
+				if trace is not None: trace.emit(traceevent.OVERLAP_REMOVED, self.pc-ins_len, mid_addr)
+				self.__drop_xrefs(mid_addr)
+				self.__uncover(mid_addr, self.__code_len(mid_addr))
 				del self.code[mid_addr]
+				self.__exact_code.discard(mid_addr)
+				if mid_addr == self.__code_hi:
+					a = mid_addr - 2
+					while not self.__is_start(a): a -= 2
+					self.__code_hi = a
 				if mid_addr in self.labels: del self.labels[mid_addr]
+				self.counters['overlap_removals'] += 1
 
 			self.__instrl = []
-			
+			prefixed = False
+			stale_dsr = False
+
 			if instr[0] == 'EXTBW': del instr[2]
 			if instr[0] == 'MOV' and type(instr[1]) == Register and type(instr[2]) != str: self.set_r(instr[1].size, instr[1].n, instr[2].value if type(instr[2]) == Num else self.get_r(instr[2].size, instr[2].n))
 
 			if instr[0] == 'PUSH' and type(instr[1]) == Register and instr[1].size == 2:
 				if prev_instr[0] == 'L' and prev_instr[1] == instr[1] and type(prev_instr[2]) == Pointer \
 					and prev_instr[2].disp is not None and prev_instr[2].disp.bits == 16 and prev_instr[2].disp.get() >= 6:
-					logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Possible far jump table at address {YELLOW}{prev_instr[2].disp.value:05X}{END}')
+					if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Possible far jump table at address {YELLOW}{prev_instr[2].disp.value:05X}{END}')
+					if trace is not None: trace.emit(traceevent.JMPTABLE_CANDIDATE, self.pc-ins_len, prev_instr[2].disp.value, far = True)
 					possible_jmp_table_adrs = prev_instr[2].disp.value
 				else:
-					if possible_jmp_table_adrs is not None: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Far jump table {YELLOW}{possible_jmp_table_adrs:05X}{END} {RED}not{END} a jump table')
+					if possible_jmp_table_adrs is not None:
+						if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Far jump table {YELLOW}{possible_jmp_table_adrs:05X}{END} {RED}not{END} a jump table')
+						if trace is not None: trace.emit(traceevent.JMPTABLE_REJECTED, self.pc-ins_len, possible_jmp_table_adrs, far = True)
 					possible_jmp_table_adrs = None
 			if instr[0] == 'PUSH' and type(instr[1]) == list and 'LR' in instr[1]:
-				if possible_jmp_table_adrs is not None: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Far jump table {YELLOW}{possible_jmp_table_adrs:05X}{END} {RED}not{END} a jump table')
+				if possible_jmp_table_adrs is not None:
+					if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Far jump table {YELLOW}{possible_jmp_table_adrs:05X}{END} {RED}not{END} a jump table')
+					if trace is not None: trace.emit(traceevent.JMPTABLE_REJECTED, self.pc-ins_len, possible_jmp_table_adrs, far = True)
 				possible_jmp_table_adrs = None
 			if instr[0] in ('B', 'BL') and type(instr[1]) == Register:
 				if prev_instr[0] == 'L' and prev_instr[1] == instr[1]:
@@ -548,9 +1155,10 @@ class Disassembly:
 					#print(hex(self.pc-2), hex(ptr_adr))
 					if ptr_adr >= 6:
 						# B/BL ERn
-						logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Near jump table @ {YELLOW}{ptr_adr:05X}{END}')
+						if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Near jump table @ {YELLOW}{ptr_adr:05X}{END}')
+						if trace is not None: trace.emit(traceevent.JMPTABLE_CANDIDATE, self.pc-ins_len, ptr_adr, far = False)
 						self.__jump_tables.append([ptr_adr, False, (self.pc-ins_len) >> 16, self.pc-ins_len])
-						self.__jump_tablesregs.append(self.r.copy())
+						self.__jump_tablesregs.append(self.r)
 				if instr[0] != 'B': self.queue_add(self.pc)
 			elif (instr[0] == 'B' and type(instr[1]) == Address) or instr[0] == 'BC':
 				radr = instr[-1].get_combined()
@@ -559,26 +1167,31 @@ class Disassembly:
 				if instr[0] == 'BC' and instr[1] != 'AL': self.queue_add(self.pc)
 			elif instr[0] == 'BL' and type(instr[1]) == Address:
 				cadr = instr[-1].get_combined() & 0xffffe
-				if cadr not in self.labels or (cadr in self.labels and self.labels[cadr][0] == labeltype.LAB): self.labels[cadr] = [labeltype.FUN, f'_f_{cadr:05X}']
+				if cadr not in self.labels or (cadr in self.labels and self.labels[cadr][0] == labeltype.LAB):
+					if trace is not None and cadr in self.labels: trace.emit(traceevent.LABEL_PROMOTED, self.pc-ins_len, cadr, old = self.labels[cadr][1], new = f'_f_{cadr:05X}')
+					self.labels[cadr] = [labeltype.FUN, f'_f_{cadr:05X}']
 				self.queue_add(cadr)
 				self.queue_add(self.pc)
 				# Attempt to detect __indru8
 				is_poppc = self.code[cadr][1][0] == 'POP' and type(self.code[cadr][1][1]) != Register and 'PC' in self.code[cadr][1][1] if cadr in self.code else self.read_word(cadr) & 0xf2ff == 0xf28e
 				if is_poppc and possible_jmp_table_adrs:
 					# POP PC (__indru8)
-					logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Confirmed far jump table @ {YELLOW}{possible_jmp_table_adrs:05X}{END}')
+					if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Confirmed far jump table @ {YELLOW}{possible_jmp_table_adrs:05X}{END}')
+					if trace is not None: trace.emit(traceevent.JMPTABLE_CONFIRMED, self.pc-ins_len, possible_jmp_table_adrs, far = True)
 					self.__jump_tables.append([possible_jmp_table_adrs, True])
-					self.__jump_tablesregs.append(self.r.copy())
+					self.__jump_tablesregs.append(self.r)
 					possible_jmp_table_adrs = None
 					if cadr not in self.labels or (cadr in self.labels and self.labels[cadr][1] != '__indru8'):
-						logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Found {MAGENTA}__indru8{END} @ {YELLOW}{cadr:05X}{END}')
+						if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Found {MAGENTA}__indru8{END} @ {YELLOW}{cadr:05X}{END}')
+						if trace is not None: trace.emit(traceevent.LABEL_PROMOTED, self.pc-ins_len, cadr, old = self.labels[cadr][1] if cadr in self.labels else None, new = '__indru8')
 						self.labels[cadr] = [labeltype.FUN, '__indru8']
 			elif instr[0] == 'RT' or instr[0] == 'RTI' or (instr[0] == 'POP' and type(instr[1]) == list and 'PC' in instr[1]):
 				if instr[0] == 'POP' and possible_jmp_table_adrs:
 					# POP PC
-					logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Confirmed far jump table @ {YELLOW}{possible_jmp_table_adrs:05X}{END}')
+					if debug: logging.debug(f'{GREEN}{self.pc-ins_len:05X}: {END}Confirmed far jump table @ {YELLOW}{possible_jmp_table_adrs:05X}{END}')
+					if trace is not None: trace.emit(traceevent.JMPTABLE_CONFIRMED, self.pc-ins_len, possible_jmp_table_adrs, far = True)
 					self.__jump_tables.append([possible_jmp_table_adrs, True])
-					self.__jump_tablesregs.append(self.r.copy())
+					self.__jump_tablesregs.append(self.r)
 					possible_jmp_table_adrs = None
 			else: self.queue_add(self.pc)
 
@@ -587,8 +1200,8 @@ class Disassembly:
 				while len(self.__jump_tables) > 0:
 					entry = self.__jump_tables.pop()
 					r = self.__jump_tablesregs.pop()
-					adr_s = min(self.code)
-					adr_l = max(self.code)
+					adr_s = self.__code_lo
+					adr_l = self.__code_hi
 					a = entry[0]
 					i = 0
 					#print('='*5, hex(a), '='*5)
@@ -608,17 +1221,24 @@ class Disassembly:
 							if not self.queue_add(adr, r):
 								if adr in self.labels: del self.labels[adr]
 								break
-							if adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN): self.labels[adr] = [labeltype.FUN, f'_f_{adr:05X}']
+							self.xrefs_code.add(adr & 0xffffe, a+i, xreftype.TABLE)
+							if adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN):
+								if trace is not None and adr in self.labels: trace.emit(traceevent.LABEL_PROMOTED, None, adr, old = self.labels[adr][1], new = f'_f_{adr:05X}')
+								self.labels[adr] = [labeltype.FUN, f'_f_{adr:05X}']
 							i += 4
 							size += 1
 							seg_tmp = self.read_word(a+i+2)
 							adr = (seg_tmp << 16) | self.read_word(a+i)
 
 						if size > 0:
-							logging.debug(f'{GREEN}Jump table processing: {END}Far jump table @ {YELLOW}{addr:05X}{END}, size {YELLOW}{size}{END}')
+							if debug: logging.debug(f'{GREEN}Jump table processing: {END}Far jump table @ {YELLOW}{addr:05X}{END}, size {YELLOW}{size}{END}')
+							if trace is not None: trace.emit(traceevent.JMPTABLE_RESOLVED, None, addr, size = size, far = True)
 							self.jump_tables[addr] = [size, True]
+							self.counters['jump_tables_found'] += 1
 							if addr not in self.data_labels or (addr in self.data_labels and self.data_labels[addr].startswith('_unk_')): self.data_labels[addr] = f'_jmp_{addr:05x}'
-						else: logging.debug(f'{GREEN}Jump table processing: {END}Far jump table @ {YELLOW}{addr:05X}{END} not a jump table')
+						else:
+							if debug: logging.debug(f'{GREEN}Jump table processing: {END}Far jump table @ {YELLOW}{addr:05X}{END} not a jump table')
+							if trace is not None: trace.emit(traceevent.JMPTABLE_REJECTED, None, addr, far = True)
 					else:
 						seg = entry[2]
 						adr = (seg << 16) | self.read_word(a+i)
@@ -629,6 +1249,7 @@ class Disassembly:
 							if not self.queue_add(adr, r):
 								if adr in self.labels: del self.labels[adr]
 								break
+							self.xrefs_code.add(adr, a+i, xreftype.TABLE)
 							if adr in self.labels and self.labels[adr][0] != labeltype.FUN and self.labels[adr][1].startswith(f'_$switch_{calladdr:05x}'): self.labels[adr][1] += f'_{j}'
 							elif adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN): self.labels[adr] = [labeltype.LAB, f'_$switch_{calladdr:05x}_{adr:05x}_case{j}']
 							i += 2
@@ -636,104 +1257,351 @@ class Disassembly:
 							j += 1
 
 						if j > 0:
-							logging.debug(f'{GREEN}Jump table processing: {END}Near jump table for {MAGENTA}seg{seg}{END} @ {YELLOW}{a:05X}{END}, size {YELLOW}{j}{END}')
+							if debug: logging.debug(f'{GREEN}Jump table processing: {END}Near jump table for {MAGENTA}seg{seg}{END} @ {YELLOW}{a:05X}{END}, size {YELLOW}{j}{END}')
+							if trace is not None: trace.emit(traceevent.JMPTABLE_RESOLVED, calladdr, a, size = j, far = False, seg = seg)
 							self.jump_tables[a] = [j, False, seg]
+							self.counters['jump_tables_found'] += 1
 							if a not in self.data_labels or (a in self.data_labels and self.data_labels[a].startswith('_unk_')): self.data_labels[a] = f'_switch_{calladdr:05x}_jmp_{a:05x}'
-						else: logging.debug(f'{GREEN}Jump table processing: {END}Near jump table @ {YELLOW}{a:05X}{END} not a jump table')
+						else:
+							if debug: logging.debug(f'{GREEN}Jump table processing: {END}Near jump table @ {YELLOW}{a:05X}{END} not a jump table')
+							if trace is not None: trace.emit(traceevent.JMPTABLE_REJECTED, calladdr, a, far = False)
 				if len(self.__queue) > 0: logging.debug('Disassembling jump table functions')
 
-		self.code = dict(sorted(self.code.items()))
-		logging.debug('Done.')
+		self.__sort_code()
+		if done: logging.debug(f'Done. Peak queue depth: {self.__queue.peak}')
+		else: logging.debug(f'Stopped with {len(self.__queue)} addresses queued')
+		return done
+
+	def __set_code(self, addr, entry, exact = False):
+		# exact: the entry cannot be rebuilt from its instruction words alone (split or stale DSR prefix)
+		h = addr >> 1
+		if self.__starts[h >> 3] >> (h & 7) & 1:
+			# an entry decoded again records its references again
+			self.__drop_xrefs(addr)
+			self.__uncover(addr, self.__code_len(addr))
+		if exact and type(self.code) == CodeStore: self.code.set_exact(addr, entry)
+		else:
+			if type(self.code) != CodeStore:
+				if addr not in self.code: self.__new_code.add(addr)
+				if exact: self.__exact_code.add(addr)
+				else: self.__exact_code.discard(addr)
+			self.code[addr] = entry
+		self.__cover(addr, len(entry[0]))
+
+	def __drop_xrefs(self, addr):
+		for target, kind, data in instr_xrefs(self.code[addr][1]): (self.xrefs_data if data else self.xrefs_code).remove(target, addr, kind)
+
+	def __is_start(self, addr):
+		h = addr >> 1
+		return self.__starts[h >> 3] >> (h & 7) & 1
+
+	def __cover(self, addr, n):
+		# Marks the n words of the code entry at addr in the coverage bitmaps.
+		h = addr >> 1
+		self.__starts[h >> 3] |= 1 << (h & 7)
+		if n > 1:
+			cont = self.__cont
+			for i in range(h + 1, min(h + n, 0x80000)): cont[i >> 3] |= 1 << (i & 7)
+		if addr < self.__code_lo: self.__code_lo = addr
+		if addr > self.__code_hi: self.__code_hi = addr
+
+	def __uncover(self, addr, n):
+		# Unmarks the code entry at addr. Entries can overlap, so a following word keeps its bit if another entry
+		# starting up to 4 words before it still covers it.
+		h = addr >> 1
+		self.__starts[h >> 3] &= ~(1 << (h & 7))
+		for i in range(h + 1, min(h + n, 0x80000)):
+			if not any(self.__is_start(a << 1) and self.__code_len(a << 1) > i - a for a in range(max(i - 4, 0), i)): self.__cont[i >> 3] &= ~(1 << (i & 7))
+
+	def coverage(self):
+		# Number of halfwords of code memory covered by code entries.
+		return bin(int.from_bytes(bytes(a | b for a, b in zip(self.__starts, self.__cont)), 'little')).count('1')
+
+	def __sort_code(self):
+		# Puts the code dict back into address order after a run. Only the entries from the lowest newly added
+		# address upwards are moved; the whole dict is only re-sorted if something else broke the order.
+		if type(self.code) == CodeStore or not self.__new_code: return
+		lo = min(self.__new_code)
+		self.__new_code.clear()
+		tail = []
+		prev = -1
+		for addr in self.code:
+			if addr >= lo: tail.append(addr)
+			elif addr < prev:
+				self.code = dict(sorted(self.code.items()))
+				return
+			else: prev = addr
+		tail.sort()
+		for addr in tail: self.code[addr] = self.code.pop(addr)
+
+	def __code_len(self, addr): return self.code.length(addr) if type(self.code) == CodeStore else len(self.code[addr][0])
+
+	def save_state(self, file, key = ''):
+		# Saves the analysis results (code, labels, data labels, jump tables, conditional branches and xrefs) so a later run
+		# on the same inputs can skip disassemble(). key identifies those inputs, see load_state().
+		# The state is plain JSON, so loading a cache file shipped with a ROM cannot run code. Code is stored in columns in
+		# the order of self.code: address, word count, flag and the words of every entry. Flag 0 or 1 means rebuild_instr()
+		# reproduces the operands from the words (1: unsigned immediate); flag 2 means the operands are in 'exact', encoded
+		# with encode_operand(). Only the entries the traversal could not store as words alone (see __set_code()) get flag 2.
+		addrs = []
+		lengths = []
+		flags = []
+		words = []
+		exact = []
+		compact = type(self.code) == CodeStore
+		for addr in self.code:
+			if compact: raw = self.code.raw(addr)
+			else:
+				instrl, instr = self.code[addr][:2]
+				raw = None if addr in self.__exact_code or not CodeStore.regular(addr, instrl) else (instrl, len(instr) > 2 and type(instr[2]) == Num and not instr[2].sign)
+			if raw is None:
+				instrl, instr = self.code[addr][:2]
+				flags.append(2)
+				exact.append([encode_operand(x) for x in instr])
+			else:
+				instrl, unsigned = raw
+				flags.append(int(unsigned))
+			addrs.append(addr)
+			lengths.append(len(instrl))
+			words.extend(instrl)
+		state = {
+			'version': cache_version,
+			'key': key,
+			'code': {'addrs': addrs, 'lengths': lengths, 'flags': flags, 'words': words, 'exact': exact},
+			'labels': [[addr, int(label[0]), label[1]] for addr, label in self.labels.items()],
+			'data_labels': list(self.data_labels.items()),
+			'jump_tables': list(self.jump_tables.items()),
+			'conds': self.conds,
+			'xrefs_code': [[target, refs.tolist()] for target, refs in self.xrefs_code.__getstate__().items()],
+			'xrefs_data': [[target, refs.tolist()] for target, refs in self.xrefs_data.__getstate__().items()],
+		}
+		with open(f'{file}.tmp', 'w') as f: f.write(json.dumps(state, separators = (',', ':')))
+		os.replace(f'{file}.tmp', file)
+
+	def load_state(self, file, key = ''):
+		# Restores a state written by save_state(). Returns False and leaves everything untouched if the file
+		# is missing, unreadable or malformed, was written by another cache_version or for a different key.
+		# A CodeStore takes the words as they are and rebuilds operands on access. For a dict, instructions with the same words
+		# are rebuilt once and copied, except relative branches (BC), whose target depends on the address.
+		# the entries are many small objects without cycles, so the cyclic garbage collector would only rescan them over and over
+		gc_enabled = gc.isenabled()
+		gc.disable()
+		try:
+			with open(file) as f: state = json.load(f)
+			if type(state) != dict or state.get('version') != cache_version or state.get('key') != key: return False
+
+			columns = state['code']
+			words = columns['words']
+			exact = iter(columns['exact'])
+			compact = type(self.code) == CodeStore
+			code = CodeStore(self.__decode_table) if compact else {}
+			exact_code = set()
+			templates = {}
+			if not len(columns['addrs']) == len(columns['lengths']) == len(columns['flags']): raise ValueError('code columns differ in length')
+			off = 0
+			for addr, n, flag in zip(columns['addrs'], columns['lengths'], columns['flags']):
+				instrl = words[off:off+n]
+				off += n
+				if flag == 2:
+					entry = [instrl, [decode_operand(x) for x in next(exact)]]
+					if compact: code.set_exact(addr, entry)
+					else:
+						code[addr] = entry
+						exact_code.add(addr)
+				elif flag not in (0, 1): raise ValueError(f'invalid code flag {flag!r}')
+				elif compact: code.set_words(addr, instrl, flag)
+				else:
+					if not CodeStore.regular(addr, instrl): raise ValueError(f'entry at {addr:05X}H cannot be rebuilt from its words')
+					k = (flag, tuple(instrl), addr) if instrl[-1] >> 12 == 0xc else (flag, tuple(instrl))
+					template = templates.get(k)
+					if template is None:
+						instr = rebuild_instr(self.__decode_table, addr, instrl, flag)
+						template = templates[k] = instr, [i for i, x in enumerate(instr) if type(x) in mutable_operands]
+					instr, mutable = template
+					instr = instr.copy()
+					for i in mutable: instr[i] = clone_operand(instr[i])
+					code[addr] = [instrl, instr]
+			if off != len(words): raise ValueError('code words do not match their lengths')
+			labels = {addr: [labeltype(kind), name] for addr, kind, name in state['labels']}
+			data_labels = {addr: name for addr, name in state['data_labels']}
+			jump_tables = {addr: entry for addr, entry in state['jump_tables']}
+			conds = list(state['conds'])
+			xrefs = []
+			for name in ('xrefs_code', 'xrefs_data'):
+				refs = XrefMap()
+				refs.__setstate__({target: array('I', sources) for target, sources in state[name]})
+				xrefs.append(refs)
+		except Exception: return False
+		finally:
+			if gc_enabled: gc.enable()
+
+		self.code = code
+		self.__new_code.clear()
+		self.__exact_code = exact_code
+		self.__starts = bytearray(0x10000)
+		self.__cont = bytearray(0x10000)
+		self.__code_lo = 0x100000
+		self.__code_hi = -1
+		for addr, n in zip(columns['addrs'], columns['lengths']): self.__cover(addr, n)
+		self.labels = labels
+		self.data_labels = data_labels
+		self.jump_tables = jump_tables
+		self.conds = conds
+		self.xrefs_code, self.xrefs_data = xrefs
+		return True
 
 	def add_region(self, start, code_bytes):
-		if type(code_bytes) not in (bytes, bytearray): raise TypeError("'code_bytes' argument must be a bytes-like object")
+		if type(code_bytes) not in (bytes, bytearray, memoryview, mmap.mmap): raise TypeError("'code_bytes' argument must be a bytes-like object")
 		if len(code_bytes) % 2 != 0: raise ValueError("'code_bytes' argument must have even length")
 		if len(code_bytes) == 0: raise ValueError("'code_bytes' argument must not be empty")
 		if start + len(code_bytes) > 0x100000: raise ValueError("region exceeds code memory limit")
 		if start < 0: raise ValueError('start address must not be negative')
 
 		self.__regions.append((start, code_bytes))
+		self.__build_pages()
+
+	def clear_all_regions(self):
+		self.__regions.clear()
+		self.__build_pages()
 
-	def clear_all_regions(self): self.__regions.clear()
+	def __build_pages(self):
+		# Segment -> regions page table. Each page lists the (start, end, view) of the regions overlapping
+		# that 64 KiB segment in load order; addresses below max() are never resolved to a region.
+		self.__max = math.ceil(max(t[0] for t in self.__regions) / 0x10000) * 0x10000 if self.__regions else 0
+		self.__pages = [()]*16
+		for start, code_bytes in self.__regions:
+			end = start + len(code_bytes)
+			view = memoryview(code_bytes)
+			for seg in range(max(start, self.__max) >> 16, (end + 0xffff) >> 16):
+				self.__pages[seg] += ((start, end, view),)
 
-	def max(self): return math.ceil(max(t[0] for t in self.__regions) / 0x10000) * 0x10000
+	def max(self): return self.__max
 
 	def is_queue_empty(self): return len(self.__queue) == 0
 
+	def queue_peak(self): return self.__queue.peak
+
 	def jmptable_add(self, addr, size, far = False, seg = 0, jmpseg = 0, calladdr = 0, bl = False):
-		r = [0]*16
+		# entries are aligned and limited to code memory like queue_add() does, as the coverage bitmaps are indexed by halfword
+		r = _zero_regs
 		a = (seg << 16) | addr
 		i = 0
 		#print('='*5, hex(a), '='*5)
 		if far:
 			for i in range(0, size*4, 4):
-				adr = (self.read_word(a+i+2) << 16) | self.read_word(a+i)
+				adr = ((self.read_word(a+i+2) << 16) | self.read_word(a+i)) & 0xffffe
 				if adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN): self.labels[adr] = [labeltype.FUN, f'_f_{adr:05X}']
-				self.__queue.append(adr)
-				self.__queueregs.append(r)
+				self.__queue.push(adr, r)
+				self.counters['queue_pushes'] += 1
+				self.xrefs_code.add(adr, a+i, xreftype.TABLE)
 		else:
 			j = 0
 			for i in range(0, size*2, 2):
-				adr = (jmpseg << 16) | self.read_word(a+i)
+				adr = ((jmpseg << 16) | self.read_word(a+i)) & 0xffffe
 				if not bl:
 					if adr in self.labels and self.labels[adr][0] != labeltype.FUN and self.labels[adr][1].startswith(f'_$switch_{calladdr:05x}'): self.labels[adr][1] += f'_{j}'
 					elif adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN): self.labels[adr] = [labeltype.LAB, f'_$switch_{calladdr:05x}_{adr:05x}_case{j}']
 				elif adr not in self.labels or (adr in self.labels and self.labels[adr][0] != labeltype.FUN): self.labels[adr] = [labeltype.FUN, f'_f_{adr:05X}']
-				self.__queue.append(adr)
-				self.__queueregs.append(r)
+				self.__queue.push(adr, r)
+				self.counters['queue_pushes'] += 1
+				self.xrefs_code.add(adr, a+i, xreftype.TABLE)
 				j += 1
 		if far: self.jump_tables[a] = [size, True]
 		else: self.jump_tables[a] = [size, False, jmpseg]
+		self.counters['jump_tables_found'] += 1
 		if a not in self.data_labels or (a in self.data_labels and self.data_labels[a].startswith('_unk_')): self.data_labels[a] = f'_jmp_{a:05x}'
 
+	def queue_len(self): return len(self.__queue)
+
 	def queue_add(self, addr, r = None):
 		if not len(self.__regions): raise ValueError('no code regions loaded')
 		if addr < 0: raise ValueError('address must not be negative')
 		addr &= 0xffffe
 		if addr not in self.code and addr not in self.__queue:
-			if (addr - 2 in self.code and len(self.code[addr - 2][0]) >= 2) or (addr - 4 in self.code and len(self.code[addr - 4][0]) >= 4):
-				logging.debug(f'Address {YELLOW}{addr:05X}{END} not added, as it is in the middle of an instruction')
+			h = addr >> 1
+			# only a word marked as following an entry start can be inside an instruction
+			if self.__cont[h >> 3] >> (h & 7) & 1 and ((addr - 2 in self.code and self.__code_len(addr - 2) >= 2) or (addr - 4 in self.code and self.__code_len(addr - 4) >= 4)):
+				if logging.getLogger().isEnabledFor(logging.DEBUG): logging.debug(f'Address {YELLOW}{addr:05X}{END} not added, as it is in the middle of an instruction')
+				if self.trace is not None: self.trace.emit(traceevent.MID_INSTRUCTION, None, addr)
+				self.counters['mid_instruction_rejects'] += 1
 				return False
-			self.__queue.append(addr)
-			self.__queueregs.append(self.r.copy() if r is None else r.copy())
+			# r may also be given as a list of 16 byte values
+			if r is None: r = self.r
+			elif type(r) != bytes:
+				r = bytes(r)
+				r = self.__regstates.setdefault(r, r)
+			self.__queue.push(addr, r)
+			self.counters['queue_pushes'] += 1
 			return True
 
+		self.counters['dedupe_hits'] += 1
 		return True
 
 	def read_word(self, addr):
 		if not len(self.__regions): raise ValueError('no code regions loaded')
 		if addr < 0: raise ValueError('address must not be negative')
-		if self.max() <= addr:
-			for start, code_bytes in self.__regions:
-				if addr >= start and addr < start + len(code_bytes): return (code_bytes[addr-start+1] << 8) | code_bytes[addr-start]
+		if addr < 0x100000:
+			for start, end, view in self.__pages[addr >> 16]:
+				if start <= addr < end: return (view[addr-start+1] << 8) | view[addr-start]
 		return self.__pad_word
 
 	def fetch(self):
 		a = self.read_word(self.pc)
 		self.__instrl.append(a)
 		self.pc += 2
+		self.counters['words_fetched'] += 1
 		return a
 
 	def decode(self, instr):
-		for _instr in self.__instrs_dsr:
-			mask = 0
-			if _instr[2] is not None: mask |= _instr[2][0]
-			mask ^= 0xffff
-
-			if instr & mask == _instr[1]: return _instr, True
+		self.counters['decode_calls'] += 1
+		entry = self.__decode_table[instr & 0xffff]
+		if entry is None: raise RuntimeError
+		return entry[0], entry[1]
 
-		for _instr in self.__instrs:
-			mask = 0
-			if _instr[2] is not None: mask |= _instr[2][0]
-			if _instr[3] is not None: mask |= _instr[3][0]
-			mask ^= 0xffff
-
-			if instr & mask == _instr[1]: return _instr, False
-
-		raise RuntimeError
+	def predecode(self, use_numpy = has_numpy):
+		# Classifies every word of every loaded region in bulk; see PreDecode.
+		if not len(self.__regions): raise ValueError('no code regions loaded')
+		cls = type(self)
+		if cls.__predecode_luts is None: cls.__predecode_luts = build_predecode_luts(self.__decode_table)
+		return [PreDecode(start, memoryview(code_bytes), cls.__predecode_luts, use_numpy) for start, code_bytes in self.__regions]
+
+	def sweep(self, workers = 1, use_numpy = has_numpy):
+		# Linear sweep for code the traversal did not reach, e.g. functions only called through computed branches.
+		# Every word is classified (see PreDecode), then each segment is walked from its start and from where known code or
+		# 0xFFFF padding ends, one instruction after another. A run of valid instructions that ends in a return or jump, or runs into
+		# known code, has its start queued and labelled as a function, so the next disassemble() call decodes it under the
+		# usual mid-instruction and overlap rules. Segments are swept in `workers` processes. Returns the addresses queued.
+		if not len(self.__regions): raise ValueError('no code regions loaded')
+		cls = type(self)
+		if cls.__predecode_luts is None: cls.__predecode_luts = build_predecode_luts(self.__decode_table)
+		pieces = []
+		for start, code_bytes in self.__regions:
+			end = start + (len(code_bytes) & ~1)
+			a = start
+			while a < end:
+				b = min((a | 0xffff) + 1, end)
+				pieces.append((a, bytes(code_bytes[a-start:b-start])))
+				a = b
+		ctx = (cls.__predecode_luts, bytes(self.__starts), bytes(self.__cont), use_numpy)
+		if workers > 1 and len(pieces) > 1:
+			import concurrent.futures
+			with concurrent.futures.ProcessPoolExecutor(min(workers, len(pieces)), initializer = sweep_init, initargs = (ctx,)) as pool:
+				results = list(pool.map(sweep_worker, *zip(*pieces)))
+		else:
+			sweep_init(ctx)
+			results = [sweep_worker(start, data) for start, data in pieces]
+
+		queued = []
+		for roots in results:
+			for addr in roots:
+				if addr in self.code or addr in self.__queue or not self.queue_add(addr): continue
+				if addr not in self.labels: self.labels[addr] = [labeltype.FUN, f'_f_{addr:05X}']
+				queued.append(addr)
+		logging.debug(f'Linear sweep queued {len(queued)} addresses')
+		return queued
 
 	def load(self, file, start = 0):
 		self.filename = file
-		with open(file, 'rb') as f: self.add_region(start, f.read())
+		self.add_region(start, map_file(file))
 
 	def __repr__(self): return f'{type(self).__name__}(...)'
@@ -5,7 +5,6 @@ if __name__ == '__main__':
 	sys.exit()
 
 import os
-import re
 import platform
 import traceback
 import tkinter as tk
@@ -23,6 +22,7 @@ except AttributeError:
 import json
 import math
 import disas
+from array import array
 import urllib.request
 import importlib
 import threading
@@ -80,14 +80,18 @@ def process_ins_param(dis, param):
 	elif type(param) == disas.Pointer and not is_lea and type(param.disp) == disas.Num and type(param.register) == disas.Register and param.register.n in (12, 14) and param.register.size == 2:
 		val = param.disp.get()
 		if param.disp.bits == 16 and ((val >= 0 and val <= 0x1f) or (val >= -0x20 and val < 0)):
-			param.register.ptr = False
-			return str(param) + '  ;  Disp16 used instead of Disp6'
+			return param.format(ptr = False) + '  ;  Disp16 used instead of Disp6'
 
 	return str(param)
 
 
 tk.Tk.report_callback_exception = report_error
 
+# listing row kinds, stored in the low 2 bits of each GUI.rows entry (addr << 2 | kind)
+ROW_BLANK = 0
+ROW_LABEL = 1
+ROW_INSTR = 2
+
 class GUI:
 	def __init__(self, window, args):
 		self.version = version
@@ -143,6 +147,14 @@ class GUI:
 		self.scrolling = False
 
 		self.dis = disas.Disassembly()
+		# background disassembly, see load_file()
+		self.disas_thread = None
+		self.disas_status = ''
+		self.disas_cancel = False
+		self.disas_snapshot = False
+		self.disas_partial = None
+		self.disas_error = None
+		self.disas_prev = None
 		self.UpdaterGUI = UpdaterGUI(self)
 
 		self.unsupported_tcl = False
@@ -162,13 +174,36 @@ Do you want to continue?\
 		self.make_canvas()
 
 	def make_canvas(self):
+		# The listing is virtual: the canvas only holds a pool of row slots big enough to fill the window, and
+		# scrolling redraws those slots from self.rows instead of moving a canvas with one item per instruction.
 		self.canvas = tk.Canvas()
-		self.canvas_scrollbar = ttk.Scrollbar(orient = 'vertical', command = self.canvas.yview)
-		self.canvas.configure(yscrollcommand = self.canvas_scrollbar.set)
+		self.canvas_scrollbar = ttk.Scrollbar(orient = 'vertical', command = self.listing_yview)
+		self.canvas.bind('<Configure>', lambda e: self.draw_rows())
 		self.canvas.bind('<MouseWheel>', self.scrollwheel)
+		self.canvas.bind('<Button-4>', lambda e: self.scrollwheel(e, 120))
+		self.canvas.bind('<Button-5>', lambda e: self.scrollwheel(e, -120))
+
+		mono = tk.font.Font(font = 'TkFixedFont').actual()
+		self.mono_bold = (mono['family'], mono['size'], 'bold')
+		self.row_h = 20
+		self.rows = array('L')
+		self.row_index = {}
+		self.top_row = 0
+		self.slots = []
+		self.slot_state = []
+
+	def scrollwheel(self, e, delta = None):
+		if self.scrolling: self.scroll_to(self.top_row - int((e.delta if delta is None else delta)/120)*3)
+
+	def listing_yview(self, *args):
+		if args[0] == 'moveto': self.scroll_to(int(float(args[1]) * len(self.rows)))
+		elif args[0] == 'scroll': self.scroll_to(self.top_row + int(args[1]) * (self.visible_rows() if args[2] == 'pages' else 1))
 
-	def scrollwheel(self, e):
-		if self.scrolling: self.canvas.yview_scroll(int(-1*(e.delta/120)), 'units')
+	def visible_rows(self): return max(1, self.canvas.winfo_height() // self.row_h)
+
+	def scroll_to(self, row):
+		self.top_row = max(0, min(row, len(self.rows) - self.visible_rows()))
+		self.draw_rows()
 
 	def start_main(self):
 		"""
@@ -479,124 +514,214 @@ Architecture: {platform.machine()}{dnl + "Settings file is saved to working dire
 		self.window.update()
 		self.set_title()
 
-		if self.args.f_import is None:
-			ttk.Label(text = 'Welcome to PyU8disasX!', font = self.bold_font).pack()
-			ttk.Label(text = '''\
+		if self.args.f_import is None: self.draw_welcome()
+		else: self.load_file(self.args.f_import)
+
+		self.window.mainloop()
+
+	def draw_welcome(self):
+		ttk.Label(text = 'Welcome to PyU8disasX!', font = self.bold_font).pack()
+		ttk.Label(text = '''\
 This is a very early version of PyU8disasX that includes basic functions such as importing binary files and exporting assembly files.
 More features will be added in the future.
 
 To start, load a binary file with File > Import... (Ctrl+I).''', justify = 'center').pack()
-		else: self.load_file(self.args.f_import)
-
-		self.window.mainloop()
 
 	def load_file(self, file = ''):
 		if len(file) == 0: file = tk.filedialog.askopenfilename(title = 'Import', initialdir = os.getcwd(), filetypes = (('Binary Files', '*.bin'), ('All Files', '*.*')), defaultextension = '.bin')
 
 		if len(file) > 0:
+			if self.disas_thread is not None:
+				tk.messagebox.showinfo('Import', 'Please wait for the current disassembly to finish or cancel it first.')
+				return
+			# restored by poll_disas() if the disassembly fails
+			self.disas_prev = (self.dis, self.window.title())
 			self.set_title(os.path.basename(file))
-			self.dis.load(file)
-			self.dis.disassemble()
-			self.draw_disas()
+			# The traversal runs on its own Disassembly in a worker thread. self.dis keeps pointing at the previous
+			# (or a partial) listing until poll_disas() swaps the finished one in.
+			dis = disas.Disassembly()
+			dis.load(file)
+			dis.progress = self.disas_progress
+			self.disas_status = 'Starting...'
+			self.disas_cancel = False
+			self.disas_snapshot = False
+			self.disas_partial = None
+			self.disas_error = None
+			self.disas_thread = threading.Thread(target = self.disas_worker, args = (dis,), daemon = True)
+			self.disas_thread.start()
+
+			self.refresh()
+			ttk.Label(text = 'Please wait', font = self.bold_font).pack()
+			ttk.Label(text = 'Disassembling... This may take a while.').pack()
+			self.draw_disas_status()
+			self.window.after(100, self.poll_disas, dis)
+
+	def disas_worker(self, dis):
+		try: dis.disassemble()
+		except Exception as e: self.disas_error = e
+
+	def disas_progress(self, dis):
+		# Runs on the worker thread between two instructions, so the model can be copied safely here.
+		self.disas_status = f'{dis.queue_len()} addresses queued, {dis.counters["decode_calls"]} instructions decoded, {dis.counters["jump_tables_found"]} jump tables found'
+		if self.disas_snapshot:
+			view = disas.Disassembly()
+			view.code = dict(sorted(dis.code.items()))
+			view.labels = dict(dis.labels)
+			view.conds = list(dis.conds)
+			self.disas_partial = view
+			self.disas_snapshot = False
+		return self.disas_cancel
+
+	def poll_disas(self, dis):
+		if self.disas_thread.is_alive():
+			if self.disas_status_label.winfo_exists(): self.disas_status_label['text'] = self.disas_status
+			if self.disas_partial is not None:
+				self.dis = self.disas_partial
+				self.disas_partial = None
+				self.draw_disas()
+			self.window.after(100, self.poll_disas, dis)
+			return
+
+		self.disas_thread = None
+		prev, self.disas_prev = self.disas_prev, None
+		if self.disas_error is not None:
+			# go back to what was shown before the import, then report the error like any other callback does
+			self.dis, title = prev
+			self.window.title(title)
+			if len(self.dis.code) > 0: self.draw_disas()
+			else:
+				self.refresh()
+				self.draw_welcome()
+			error = self.disas_error
+			self.disas_error = None
+			try: raise error
+			except Exception: report_error(term = False)
+			return
+		dis.progress = None
+		self.dis = dis
+		self.draw_disas()
+		if self.disas_cancel: self.set_title(f'{os.path.basename(dis.filename)} (incomplete)')
+
+	def draw_disas_status(self):
+		bar = ttk.Frame()
+		bar.pack(side = 'bottom', fill = 'x')
+		ttk.Button(bar, text = 'Cancel', command = self.cancel_disas).pack(side = 'right')
+		ttk.Button(bar, text = 'Show partial results', command = self.request_partial).pack(side = 'right')
+		self.disas_status_label = ttk.Label(bar, text = self.disas_status)
+		self.disas_status_label.pack(side = 'left')
+
+	def request_partial(self): self.disas_snapshot = True
+
+	def cancel_disas(self): self.disas_cancel = True
 
 	def draw_disas(self):
-		mono = tk.font.Font(font = 'TkFixedFont').actual()
-
 		self.refresh()
 		self.make_canvas()
-		head = ttk.Label(text = 'Please wait', font = self.bold_font); head.pack()
-		body = ttk.Label(text = 'Drawing disassembly listing... This may take a while.'); body.pack()
-		self.window.update()
+		ttk.Label(text = 'Disassembly' if self.disas_thread is None else 'Disassembly (partial)', font = self.bold_font).pack()
+		if self.disas_thread is not None: self.draw_disas_status()
 
-		y = 0
-		for addr, ins in self.dis.code.items():
-			self.window.update()
-			if addr in self.dis.labels:
-				l = self.dis.labels[addr]
-				if l[0] == disas.labeltype.FUN: y += 20
-				self.canvas.create_text(0, y, anchor = 'nw', text = f'{l[1]}:', font = 'TkFixedFont')
-				y += 20
-
-			instrl = ins[0]
-			instr = ins[1]
+		self.build_rows()
+		self.canvas_scrollbar.pack(side = 'right', fill = 'y')
+		self.canvas.pack(side = 'left', fill = 'both', expand = True)
+		self.scrolling = True
+		self.window.update_idletasks()
+		self.draw_rows()
+
+	def build_rows(self):
+		# One entry per listing row in address order; row_index maps a code address to its first row
+		# (the blank line before a function, or its label).
+		self.rows = array('L')
+		self.row_index = {}
+		labels = self.dis.labels
+		for addr in self.dis.code:
+			self.row_index[addr] = len(self.rows)
+			if addr in labels:
+				if labels[addr][0] == disas.labeltype.FUN: self.rows.append(addr << 2 | ROW_BLANK)
+				self.rows.append(addr << 2 | ROW_LABEL)
+			self.rows.append(addr << 2 | ROW_INSTR)
+
+	def make_slot(self):
+		slot = len(self.slots)
+		y = slot * self.row_h
+		# prefix (or label), mnemonic, operand 1, separator, operand 2
+		items = [
+			self.canvas.create_text(0, y, anchor = 'nw', font = 'TkFixedFont', tag = f's{slot}_p'),
+			self.canvas.create_text(0, y, anchor = 'nw', font = self.mono_bold, fill = 'blue', tag = f's{slot}_0'),
+			self.canvas.create_text(0, y, anchor = 'nw', font = 'TkFixedFont', tag = f's{slot}_1'),
+			self.canvas.create_text(0, y, anchor = 'nw', tag = f's{slot}_12'),
+			self.canvas.create_text(0, y, anchor = 'nw', font = 'TkFixedFont', tag = f's{slot}_2'),
+		]
+		for idx, item in ((1, items[2]), (2, items[4])):
+			self.canvas.tag_bind(item, '<Button-1>', lambda e, slot = slot, idx = idx: self._slot_click(slot, idx))
+			self.canvas.tag_bind(item, '<Enter>', lambda e, slot = slot, idx = idx, item = item: self._slot_hover(slot, idx, item, 'blue'))
+			self.canvas.tag_bind(item, '<Leave>', lambda e, slot = slot, idx = idx, item = item: self._slot_hover(slot, idx, item, 'black'))
+			self.canvas.tag_bind(item, '<Button-3>', lambda e, slot = slot, idx = idx: self.do_context_menu(e, slot, idx))
+		self.slots.append(items)
+		# (address, {operand index: jump target, or None if the operand only reacts to hovering})
+		self.slot_state.append((None, {}))
+
+	def draw_rows(self):
+		if not self.rows: return
+		n = self.visible_rows() + 1
+		while len(self.slots) < n: self.make_slot()
+		for slot in range(len(self.slots)): self.draw_row(slot, self.top_row + slot if slot < n else len(self.rows))
+		self.canvas_scrollbar.set(self.top_row / len(self.rows), min(1, (self.top_row + n - 1) / len(self.rows)))
+
+	def draw_row(self, slot, row):
+		c = self.canvas
+		prefix, *ops = self.slots[slot]
+		for item in ops: c.itemconfigure(item, text = '')
+		if row >= len(self.rows):
+			c.itemconfigure(prefix, text = '')
+			self.slot_state[slot] = (None, {})
+			return
+
+		addr = self.rows[row] >> 2
+		kind = self.rows[row] & 3
+		state = {}
+		self.slot_state[slot] = (addr, state)
+		if kind == ROW_BLANK: c.itemconfigure(prefix, text = '')
+		elif kind == ROW_LABEL: c.itemconfigure(prefix, text = f'{self.dis.labels[addr][1]}:')
+		else:
+			instrl, instr = self.dis.code[addr][:2]
 			bc = addr in self.dis.conds
 			tab = ' '*4
-			opx = self.canvas.bbox(self.canvas.create_text(0, y, anchor = 'nw', text = f'{addr >> 16:X}:{addr & 0xfffe:04X}H{tab*2}{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))}\t', font = 'TkFixedFont'))[2]
-			opx = self.canvas.bbox(self.canvas.create_text(opx, y, anchor = 'nw', text = f'{instr[0] if bc and self.bc_cond or not bc else "B"+instr[1]} ', font = (mono['family'], mono['size'], 'bold'), fill = 'blue', tag = f'i_{addr:05X}_0'))[2]
+			c.itemconfigure(prefix, text = f'{addr >> 16:X}:{addr & 0xfffe:04X}H{tab*2}{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))}\t')
+			opx = c.bbox(prefix)[2]
+			c.coords(ops[0], opx, slot * self.row_h)
+			c.itemconfigure(ops[0], text = f'{instr[0] if bc and self.bc_cond or not bc else "B"+instr[1]} ')
+			opx = c.bbox(ops[0])[2]
 			for i, op in enumerate(instr[1:]):
-				if i == 0 and bc and not self.bc_cond:
-					self.canvas.create_text(opx, y, anchor = 'nw', tag = f'i_{addr:05X}_1', font = 'TkFixedFont')
-					continue
-				if i > 0: opx = self.canvas.bbox(self.canvas.create_text(opx, y, anchor = 'nw', text = ',  ' if bc and self.bc_cond or not bc else '', tag = f'i_{addr:05X}_{i}{i+1}'))[2]
+				if i == 0 and bc and not self.bc_cond: continue
+				if i > 0:
+					c.coords(ops[2], opx, slot * self.row_h)
+					c.itemconfigure(ops[2], text = ',  ' if bc and self.bc_cond or not bc else '')
+					opx = c.bbox(ops[2])[2]
+				item = ops[1] if i == 0 else ops[3]
+				c.coords(item, opx, slot * self.row_h)
+				c.itemconfigure(item, fill = 'black')
 				if type(op) == disas.Address:
 					adr = op.get_combined()
-					if adr in self.dis.labels:
-						s_op = self.canvas.create_text(opx, y, anchor = 'nw', text = self.dis.labels[adr][1], tag = f'i_{addr:05X}_{i+1}', font = 'TkFixedFont')
-						self.canvas.tag_bind(s_op, '<Button-1>', lambda e, adr = adr: self._canvas_moveto_address(adr))
-					else:
-						s_op = self.canvas.create_text(opx, y, anchor = 'nw', text = op, tag = f'i_{addr:05X}_{i+1}', font = 'TkFixedFont')
-						self.canvas.tag_bind(s_op, '<Button-1>', lambda e, adr = adr: self._canvas_moveto_address(adr, False))
-					self.canvas.tag_bind(s_op, '<Enter>', lambda e, tag = s_op: self._canvas_enter(tag))
-					self.canvas.tag_bind(s_op, '<Leave>', lambda e, tag = s_op: self._canvas_leave(tag))
-					self.canvas.tag_bind(s_op, '<Button-3>', self.do_context_menu)
-				elif type(op) == disas.Register:
-					s_op = self.canvas.create_text(opx, y, anchor = 'nw', text = op, tag = f'i_{addr:05X}_{i+1}', font = 'TkFixedFont')
-				else: 
-					s_op = self.canvas.create_text(opx, y, anchor = 'nw', text = op, tag = f'i_{addr:05X}_{i+1}', font = 'TkFixedFont')
-					self.canvas.tag_bind(s_op, '<Enter>', lambda e, tag = s_op: self._canvas_enter(tag))
-					self.canvas.tag_bind(s_op, '<Leave>', lambda e, tag = s_op: self._canvas_leave(tag))
-					self.canvas.tag_bind(s_op, '<Button-3>', self.do_context_menu)
-				opx = self.canvas.bbox(s_op)[2]
-			y += 20
-		self.canvas.config(scrollregion = self.canvas.bbox('all'))
-
-		body.destroy()
-		head['text'] = 'Disassembly'
-		self.canvas_scrollbar.pack(side = 'right', fill = 'y')
-		self.canvas.pack(side = 'left', fill = 'both', expand = True)
-		self.window.update()
+					c.itemconfigure(item, text = self.dis.labels[adr][1] if adr in self.dis.labels else op)
+					state[i+1] = adr
+				else:
+					c.itemconfigure(item, text = op)
+					if type(op) != disas.Register: state[i+1] = None
+				opx = c.bbox(item)[2]
 
 	def replace_bcond(self):
-		bccond = self.bc_cond_tk.get()
-		if bccond and not self.bc_cond:
-			for addr in Progressbar(self, self.dis.conds, 'Bcond Radr -> BC cond, Radr'):
-				instr = self.dis.code[addr][1]
-				self.canvas.itemconfigure(f'i_{addr:05X}_0', text = 'BC ')
-				self.canvas.itemconfigure(f'i_{addr:05X}_1', text = instr[1])
-				self._canvas_update_bbox(f'i_{addr:05X}_1', f'i_{addr:05X}_0')
-				self.canvas.itemconfigure(f'i_{addr:05X}_12', text = ', ')
-				self._canvas_update_bbox(f'i_{addr:05X}_12', f'i_{addr:05X}_1')
-				self.canvas.itemconfigure(f'i_{addr:05X}_2', text = instr[2])
-				self._canvas_update_bbox(f'i_{addr:05X}_2', f'i_{addr:05X}_12')
-				pb.inc()
-		elif not bccond and self.bc_cond:
-			for addr in Progressbar(self, self.dis.conds, 'BC cond, Radr -> Bcond Radr'):
-				instr = self.dis.code[addr][1]
-				self.canvas.itemconfigure(f'i_{addr:05X}_0', text = f'B{instr[1]} ')
-				self.canvas.itemconfigure(f'i_{addr:05X}_1', text = '')
-				self.canvas.itemconfigure(f'i_{addr:05X}_12', text = '')
-				self._canvas_update_bbox(f'i_{addr:05X}_2', f'i_{addr:05X}_0')
-
-		self.bc_cond = bccond
-
-	def _canvas_get_tag(self):
-		item = self.canvas.find_withtag('current')
-		tags = self.canvas.gettags(item)
-		return tags[0]
-
-	def _canvas_update_bbox(self, tag1, tag2):
-		box = self.canvas.bbox(tag2)
-		self.canvas.coords(tag1, box[2], box[1])
-
-	def _canvas_enter(self, tag): self.canvas.itemconfigure(tag, fill = 'blue')
-
-	def _canvas_leave(self, tag): self.canvas.itemconfigure(tag, fill = 'black')
-
-	def _canvas_moveto_address(self, addr, has_label = True):
-		bbox = self.canvas.bbox(f'i_{addr:05X}_0')
-		if bbox:
-			_, _, _, scroll_hi = map(int, self.canvas.cget('scrollregion').split())
-			self.canvas.yview_moveto((bbox[1] - (40 if has_label else 20)) / scroll_hi)
+		self.bc_cond = self.bc_cond_tk.get()
+		self.draw_rows()
+
+	def _slot_hover(self, slot, idx, item, fill):
+		if idx in self.slot_state[slot][1]: self.canvas.itemconfigure(item, fill = fill)
+
+	def _slot_click(self, slot, idx):
+		adr = self.slot_state[slot][1].get(idx)
+		if adr is not None: self._canvas_moveto_address(adr)
+
+	def _canvas_moveto_address(self, addr):
+		if addr in self.row_index: self.scroll_to(self.row_index[addr])
 
 	def export_omf(self):
 		f = tk.filedialog.asksaveasfile(title = 'Export as RASU8 assembly', initialdir = os.getcwd(), initialfile = f'{os.path.splitext(self.dis.filename)[0]}.asm', filetypes = (('Assembly Files', '*.asm'), ('All Files', '*.*')), defaultextension = '.asm')
@@ -635,14 +760,9 @@ To start, load a binary file with File > Import... (Ctrl+I).''', justify = 'cent
 		f.close()
 		tk.messagebox.showinfo('Export as RASU8 assembly', 'The export was successful.')
 
-	def do_context_menu(self, event):
-		tag = self._canvas_get_tag()
-
-		m = re.match(r'^i_([0-9A-F]{5})_(\d)$', tag)
-		if m is None: return
-
-		addr = int(m.group(1), 16)
-		idx = int(m.group(2))
+	def do_context_menu(self, event, slot, idx):
+		addr, state = self.slot_state[slot]
+		if idx not in state: return
 
 		param = self.dis.code[addr][1][idx]
 		if type(param) == disas.Num:
@@ -664,7 +784,7 @@ To start, load a binary file with File > Import... (Ctrl+I).''', justify = 'cent
 
 	def set_param_attr(self, addr, idx, name, value):
 		setattr(self.dis.code[addr][1][idx], name, value)
-		self.canvas.itemconfigure(f'i_{addr:05X}_{idx}', text = self.dis.code[addr][1][idx])
+		self.draw_rows()
 
 class Progressbar(tk.Toplevel):
 	def __init__(self, gui, iterable, text = None, *args, **kwargs):
@@ -6,9 +6,15 @@ if sys.version_info < (3, 8, 0):
 import os
 import io
 import math
+import bisect
+import hashlib
+import time
+import contextlib
+import json
+from collections import deque
+from array import array
 import disas
 import logging
-import functools
 
 try:
 	import labeltool.labeltool as labeltool
@@ -59,18 +65,19 @@ def process_ins_param(dis, param, is_lea = False, data_bit_labels = None, lo = F
 	elif type(param) == disas.Pointer and not is_lea and type(param.disp) == disas.Num and type(param.register) == disas.Register and param.register.n in (12, 14) and param.register.size == 2:
 		val = param.disp.get()
 		if param.disp.bits == 16 and ((val >= 0 and val <= 0x1f) or (val >= -0x20 and val < 0)):
-			param.register.ptr = False
-			return case(str(param), lo) + '  ;  Disp16 used instead of Disp6'
+			return case(param.format(ptr = False), lo) + '  ;  Disp16 used instead of Disp6'
 
 	return case(str(param), lo)
 
-@functools.lru_cache
 def get_byte(b):
 	fmt = f'{b:3X}H'
 	if b >= 0xa and b <= 0xf: fmt = ' 0' + fmt[2:]
 	elif b >= 0xa0: fmt = '0' + fmt[1:]
 	return fmt
 
+# DB operands for every byte value, indexed by [lo][byte]
+db_bytes = (tuple(get_byte(b) for b in range(256)), tuple(get_byte(b).lower() for b in range(256)))
+
 def log_exc(func, exc):
 	if issubclass(type(exc), OSError):
 		if os.name == 'nt':
@@ -82,73 +89,324 @@ def log_exc(func, exc):
 
 def case(s, lo): return str(s).lower() if lo else str(s).upper()
 
-def disassemble(filename, out, labelfile = '', dclfile = '', romwin = None, addresses = False, disas_all = False, lo = False):
-	logging.info('Loading binary')
-	size = 0
-	rom = b''
-	try:
-		with open(filename, 'rb') as f:
-			rom = f.read()
-			size = len(rom)
-			dis = disas.Disassembly(rom)
-	except Exception as e:
-		log_exc(logging.error, e)
+# the vector table, --all and sweep passes run in analyse() here. bump this whenever they start finding different
+# results, like disas.cache_version for the traversal, so older cached analyses are not used any more
+analysis_version = 1
+
+# identifies the inputs of an analysis run for the on-disk cache
+def cache_key(rom, files, *options):
+	h = hashlib.sha256(rom)
+	h.update(f'{disas.cache_version}-{analysis_version}'.encode())
+	for file in files:
+		with open(file, 'rb') as f: h.update(hashlib.sha256(f.read()).digest())
+	h.update(repr(options).encode())
+	return h.hexdigest()
+
+# wall and CPU time per phase, counters and general information about a run.
+# time spent in a nested phase is not counted towards the enclosing one
+class Stats:
+	def __init__(self, profile = False):
+		self.info = {}
+		self.phases = {}
+		self.counters = {}
+		self.profiler = None
+		if profile:
+			import cProfile
+			self.profiler = cProfile.Profile()
+		self.__nested = []
+
+	@contextlib.contextmanager
+	def phase(self, name, profile = False):
+		self.__nested.append([0.0, 0.0])
+		wall = time.perf_counter()
+		cpu = time.process_time()
+		if profile and self.profiler is not None: self.profiler.enable()
+		try: yield
+		finally:
+			if profile and self.profiler is not None: self.profiler.disable()
+			wall = time.perf_counter() - wall
+			cpu = time.process_time() - cpu
+			nested = self.__nested.pop()
+			p = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+			p['wall'] += wall - nested[0]
+			p['cpu'] += cpu - nested[1]
+			p['calls'] += 1
+			if self.__nested:
+				self.__nested[-1][0] += wall
+				self.__nested[-1][1] += cpu
+
+	def to_dict(self): return {'info': self.info, 'phases': self.phases, 'counters': self.counters}
+
+# buffers writes and hands them to the sink every flush_size characters
+class AsmWriter:
+	def __init__(self, sink, flush_size = 0x10000, stats = None):
+		self.sink = sink
+		self.flush_size = flush_size
+		self.stats = Stats() if stats is None else stats
+		self.__parts = []
+		self.__size = 0
+
+	def write(self, s):
+		self.__parts.append(s)
+		self.__size += len(s)
+		if self.__size >= self.flush_size: self.flush()
+
+	def flush(self):
+		with self.stats.phase('write'):
+			if self.__parts:
+				self.sink.write(''.join(self.__parts))
+				self.__parts.clear()
+				self.__size = 0
+			self.sink.flush()
+
+# '-' is stdout, objects with write() are used as-is. a file is written as <out>.tmp and only replaces out once
+# everything was written, so a failure partway through leaves no truncated output
+@contextlib.contextmanager
+def open_output(out):
+	if out == '-' or hasattr(out, 'write'):
+		yield sys.stdout if out == '-' else out
 		return
-	num_segs = math.ceil(size / 0x10000)
+	f = open(f'{out}.tmp', 'w')
+	try: yield f
+	except BaseException:
+		f.close()
+		os.remove(f'{out}.tmp')
+		raise
+	f.close()
+	os.replace(f'{out}.tmp', out)
 
-	sfr_labels = {}
-	dcl_name = 'foo'
-	data_bit_labels = {}
+def write_segment(f, dis, view, seg, events, table_dt, dt_keys, interrupts, data_bit_labels, romwin = 0, addresses = False, lo = False, xrefs = False):
+	tab = '\t'
+	byte_strs = db_bytes[bool(lo)]
+	db = case('DB', lo)
+	table_mode = seg == 0
+	tbytes_line = 0
+	tbytes_mode = False
+	f.write(case(f'\n{"T" if table_mode else "C"}SEG #{seg} AT 0\n\n', lo))
+	pos = seg << 16
+	end = pos + 0x10000
+	i = bisect.bisect_left(events, pos)
+	n = bisect.bisect_left(events, end)
+	while pos < end:
+		if not table_mode and pos & 1:
+			pos += 1
+			continue
+		while i < n and events[i] < pos: i += 1
+		nxt = events[i] if i < n else end
+		if nxt > pos:
+			# data run up to the next event
+			if not table_mode:
+				if pos < romwin: f.write(case(f'\nTSEG #{seg} AT {pos:05X}H\n\n', lo))
+				else: f.write('\n')
+				table_mode = True
+				tbytes_line = 0
+			tbytes_mode = True
+			j = bisect.bisect_left(dt_keys, pos)
+			while pos < nxt:
+				stop = dt_keys[j] if j < len(dt_keys) and dt_keys[j] < nxt else nxt
+				if stop == pos:
+					if tbytes_line > 0: f.write('\n\n')
+					else: f.write('\n')
+					tbytes_line = 0
+					f.write(f'; {pos:05X}\n{table_dt[pos]}:\n')
+					j += 1
+					stop = dt_keys[j] if j < len(dt_keys) and dt_keys[j] < nxt else nxt
+				data = view[pos:stop]
+				k = 0
+				while k < len(data):
+					take = min(16 - tbytes_line, len(data) - k)
+					line = ', '.join(map(byte_strs.__getitem__, data[k:k+take]))
+					if tbytes_line == 0: f.write(f'{"/*"+tab+format(pos+k, "05X")+tab+"*/ " if addresses else tab}{db} {line}')
+					else: f.write(', ' + line)
+					tbytes_line += take
+					k += take
+					if tbytes_line == 16:
+						f.write('\n')
+						tbytes_line = 0
+				pos = stop
+			continue
 
-	interrupts = {}
-	if dclfile:
-		logging.info('Loading DCL file')
-		try:
-			reader = dcl.DCLReader(dclfile)
-			reader.parse()
-			for k, v in reader.data_labels.items():
-				dis.data_labels[k] = v
-				sfr_labels[k] = v
-			for k, v in reader.data_bit_labels.items(): data_bit_labels[k] = v
-			dcl_name = os.path.splitext(os.path.basename(dclfile))[0]
-			if romwin is None: romwin = reader.romwin
-			interrupts = dict(sorted(reader.interrupts.items()))
-		except Exception as e: log_exc(logging.warning, e)
-	else:
-		if romwin is None: romwin = 0
+		addr = pos
+		if addr < 6:
+			if not table_mode:
+				if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n', lo))
+				table_mode = True
+				tbytes_line = 0
+			elif tbytes_mode:
+				if tbytes_line > 0: f.write('\n\n')
+				tbytes_mode = False
+				tbytes_line = 0
+			word = dis.read_word(addr)
+			if addr == 0: f.write(f'; Initial SP\n{"/*"+tab+"00000"+tab+"*/ " if addresses else tab}{case("DW", lo)} {case(disas.Address(word), lo)}\n')
+			elif addr == 2: f.write(f'; Entry point\n{"/*"+tab+"00002"+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n')
+			elif addr == 4: f.write(f'; BRK interrupt entry point\n{"/*"+tab+"00004"+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n')
+			pos = addr + 2
+		elif addr in interrupts:
+			if not table_mode:
+				if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n\n', lo))
+				table_mode = True
+				tbytes_line = 0
+			elif tbytes_mode:
+				if tbytes_line > 0: f.write('\n\n')
+				tbytes_mode = False
+				tbytes_line = 0
+			word = dis.read_word(addr)
+			f.write(f'; Interrupt: {interrupts[addr]}\n{"/*"+tab+format(addr, "05X")+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n\n')
+			pos = addr + 2
+		elif addr in dis.jump_tables:
+			if not table_mode:
+				if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n', lo))
+				table_mode = True
+				tbytes_line = 0
+			elif tbytes_mode:
+				if tbytes_line > 0: f.write('\n\n')
+				else: f.write('\n')
+				tbytes_mode = False
+				tbytes_line = 0
+			entry = dis.jump_tables[addr]
+			size = entry[0]
+			f.write(f'; {addr:05X}\n{dis.data_labels[addr]}:\n')
+			if entry[1]:
+				_size = 0
+				for a in range(addr, addr+size*4, 4):
+					word1 = dis.read_word(a)
+					word2 = dis.read_word(a+2)
+					func_name = process_ins_param(dis, disas.Address(word1, word2))
+					f.write(f'{"/*"+tab+format(a, "05X")+tab+format(word1,"04X")+tab*2+" */ " if addresses else tab}{case("DW OFFSET", lo)} ({func_name})\n')
+					f.write(f'{"/*"+tab+format(a+2, "05X")+tab+format(word2,"04X")+tab*2+" */ " if addresses else tab}{case("DW OFFSET", lo)} ({func_name})\n')
+					_size += 1
+					if a+4 in dis.jump_tables or a+4 in dis.data_labels or a+4 in dis.code:
+						size = _size
+						break
+				skip = size * 4
+			else:
+				s = entry[2]
+				_size = 0
+				for a in range(addr, addr+size*2, 2):
+					word = dis.read_word(a)
+					f.write(f'{"/*"+tab+format(a, "05X")+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, s), lo)}\n')
+					_size += 1
+					if a+2 in dis.jump_tables or a+2 in dis.data_labels or a+2 in dis.code:
+						size = _size
+						break
+				skip = size * 2
+			f.write('\n')
+			# an empty table swallows the rest of the segment
+			if not skip: break
+			pos = addr + skip
+		else:
+			if table_mode:
+				if tbytes_mode:
+					if tbytes_line > 0: f.write('\n')
+					tbytes_mode = False
+					tbytes_line = 0
+				if addr < romwin: f.write(case(f'\nCSEG #{seg} AT {addr:05X}H\n', lo))
+				table_mode = False
+			if addr in dis.labels:
+				if dis.labels[addr][0] == disas.labeltype.FUN:
+					f.write(f'\n; {addr:05X}\n')
+					if xrefs:
+						callers = [format(source, '05X') for source, kind in dis.xrefs_code.get(addr)]
+						for k in range(0, len(callers), 8): f.write(f'; Called from {", ".join(callers[k:k+8])}\n')
+				f.write(f'{dis.labels[addr][1]}:\n')
+			ins = dis.code[addr]
+			instrl = ins[0]
+			instr = ins[1]
+			#string = f'{addr >> 16:X}:{addr & 0xfffe:04X}H\t\t{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))}\t{instr[0]}'
+			if addresses:
+				string = f'/*\t{addr:05X}\t{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))} */ {case(instr[0], lo)}'
+			else: string = f'\t{case(instr[0], lo)}'
+			is_lea = instr[0] == 'LEA'
+			if len(instr) >= 2: string += ' ' + process_ins_param(dis, instr[1], is_lea, data_bit_labels, lo)
+			if len(instr) == 3: string += ', ' + process_ins_param(dis, instr[2], is_lea, data_bit_labels, lo)
+			f.write(string + '\n')
+			# so does an entry without words
+			if not instrl: break
+			# odd addresses are not visited in code mode
+			pos = (addr & ~1) + len(instrl) * 2
 
-	if labelfile:
-		logging.info('Loading label files')
-		for file in labelfile:
-			try:
-				with open(file) as f: labels, data_labels, _data_bit_labels = labeltool.load_labels(f, 0)
-				for k, v in labels.items():
-					if v[1]: dis.labels[k] = [disas.labeltype.FUN, ('' if v[0].endswith('u8') or (v[0].endswith('_n') and not v[0].endswith('base_n')) or v[0].endswith('_nn') else '_')+v[0].replace('.', '_')]
-					else: dis.labels[k] = [disas.labeltype.LAB, f'_${labels[v[2]][0]}_{v[0][1:]}']
-				for k, v in data_labels.items():
-					name = '_' + v.replace('.', '_')
-					if v == f'd_{k:05X}':
-						if k >= romwin: dis.data_labels[k] = name
-						else: dis.data_labels[k] = f'_unk_{k:05x}'
-					else: dis.data_labels[k] = name
-				for k, v in _data_bit_labels.items(): data_bit_labels[k] = '_' + v
-			except Exception as e: log_exc(logging.warning, e)
-	logging.info('Disassembling')
-	dis.disassemble()
-	logging.info('Disassembling vector table')
-	for addr in interrupts:
-		func_addr = dis.read_word(addr)
-		if func_addr not in dis.labels: dis.labels[func_addr] = [disas.labeltype.FUN, f'_int_{interrupts[addr]}']
-		dis.queue_add(func_addr)
-	dis.disassemble()
-	if disas_all:
-		logging.info('Adding undetected functions to queue')
-		for addr in dis.labels:
-			if addr not in dis.code: dis.queue_add(addr)
-		logging.info('Disassembling undetected functions')
-		dis.disassemble()
+	if tbytes_mode: f.write('\n')
+
+
+# picklable stand-in for the parts of a Disassembly the listing reads, used to render segments in worker processes
+class ListingModel:
+	def __init__(self, dis, rom):
+		self.labels = dis.labels
+		self.data_labels = dis.data_labels
+		self.jump_tables = dis.jump_tables
+		self.xrefs_code = dis.xrefs_code
+		self.rom = bytes(rom)
+		# addresses past code memory always read as the pad word
+		self.pad_word = dis.read_word(0x100000)
+		self.code = None
+
+	def read_word(self, addr):
+		if addr < len(self.rom): return (self.rom[addr+1] << 8) | self.rom[addr]
+		return self.pad_word
+
+# code entries of the segment being rendered. other addresses are only tested for membership, against the sorted address array
+class SegmentCode:
+	def __init__(self, seg, entries, addrs):
+		self.seg = seg
+		self.entries = entries
+		self.addrs = addrs
 
+	def __getitem__(self, addr): return self.entries[addr]
+	def __contains__(self, addr):
+		if addr >> 16 == self.seg: return addr in self.entries
+		i = bisect.bisect_left(self.addrs, addr)
+		return i < len(self.addrs) and self.addrs[i] == addr
+
+render_ctx = None
+
+def render_init(ctx):
+	global render_ctx
+	render_ctx = ctx
+
+def render_worker(seg, entries):
+	model, args = render_ctx
+	model.code = SegmentCode(seg, entries, args[0])
 	f = io.StringIO()
+	view = memoryview(model.rom)
+	write_segment(f, model, view, seg, *args[1:])
+	view.release()
+	return f.getvalue()
+
+# renders every segment in a process pool and yields the text of each in order
+def render_segments(dis, rom, addrs, events, table_dt, dt_keys, interrupts, data_bit_labels, romwin, addresses, lo, xrefs, workers):
+	import concurrent.futures
+	num_segs = math.ceil(len(rom) / 0x10000)
+	ctx = (ListingModel(dis, rom), (addrs, events, table_dt, dt_keys, interrupts, data_bit_labels, romwin, addresses, lo, xrefs))
+	with concurrent.futures.ProcessPoolExecutor(min(workers, num_segs), initializer = render_init, initargs = (ctx,)) as pool:
+		futures = []
+		for seg in range(num_segs):
+			seg_addrs = addrs[bisect.bisect_left(addrs, seg << 16):bisect.bisect_left(addrs, (seg + 1) << 16)]
+			futures.append(pool.submit(render_worker, seg, {addr: dis.code[addr] for addr in seg_addrs}))
+		for future in futures: yield future.result()
+
+def write_listing(f, dis, rom, interrupts, sfr_labels, data_bit_labels, dcl_name = 'foo', romwin = 0, addresses = False, lo = False, workers = 1, stats = None, xrefs = False):
+	if stats is None: stats = Stats()
+	size = len(rom)
+	num_segs = math.ceil(size / 0x10000)
+
+	with stats.phase('symbols'): write_symbols(f, dis, size, sfr_labels, dcl_name, romwin, lo)
+	table_dt = {k: v for k, v in dis.data_labels.items() if k < 0x10000 and k < romwin and k not in sfr_labels}
+
+	with stats.phase('listing'):
+		logging.info('Writing disassembly')
+		# every address the emitter has to stop at; anything in between is a data run
+		addrs = array('I', sorted(dis.code))
+		events = sorted({0, 2, 4}.union(interrupts, dis.jump_tables, addrs))
+		dt_keys = sorted(table_dt)
+		if workers > 1 and num_segs > 1:
+			for text in render_segments(dis, rom, addrs, events, table_dt, dt_keys, interrupts, data_bit_labels, romwin, addresses, lo, xrefs, workers): f.write(text)
+		else:
+			view = memoryview(rom)
+			for seg in range(num_segs): write_segment(f, dis, view, seg, events, table_dt, dt_keys, interrupts, data_bit_labels, romwin, addresses, lo, xrefs)
+			view.release()
+		f.write(case('\nEND\n', lo))
+
+def write_symbols(f, dis, size, sfr_labels, dcl_name = 'foo', romwin = 0, lo = False):
 	logging.info('Writing initialization directives')
 	f.write(f'''\
 /* =========================================================
@@ -166,7 +424,6 @@ https://github.com/gamingwithevets/pyu8disasx
 	logging.info('Writing symbol definitions')
 	l = math.ceil(max(len(v) for v in dis.data_labels.values()) / 4) * 4
 	equs = ''
-	table_dt = {}
 	dis.data_labels = dict(sorted(dis.data_labels.items()))
 	for k, v in dis.data_labels.items():
 		if k in sfr_labels: continue
@@ -177,145 +434,403 @@ https://github.com/gamingwithevets/pyu8disasx
 			_k = k & 0xffff
 			equs += f'{v}{tabs}{case("EQU", lo)} {"" if _s < 10 else "0"}{case(format(_s, "X")+"H", lo)}:{"" if hex(_k)[2].isnumeric() else "0"}{case(format(_k, "04X")+"H", lo)}\n' 
 		elif k >= romwin: equs += f'{v}{tabs}{case("EQU", lo)} {"" if hex(k)[2].isnumeric() else "0"}{case(format(k, "04X")+"H", lo)}\n'
-		else: table_dt[k] = v
 
 	f.write(equs)
 
-	logging.info('Writing disassembly')
-	tab = '\t'
-	for seg in range(num_segs):
-		table_mode = seg == 0
-		tbytes_line = 0
-		tbytes_mode = False
-		skip_byte = 0
-		f.write(case(f'\n{"T" if table_mode else "C"}SEG #{seg} AT 0\n\n', lo))
-		for addr16 in range(0x10000):
-			if not table_mode and addr16 % 2 != 0: continue
-			if skip_byte:
-				skip_byte -= 1
-				continue
-			addr = (seg << 16) + addr16
-			if addr < 6:
-				if not table_mode:
-					if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n', lo))
-					table_mode = True
-					tbytes_line = 0
-				elif tbytes_mode:
-					if tbytes_line > 0: f.write('\n\n')
-					tbytes_mode = False
-					tbytes_line = 0
-				word = dis.read_word(addr)
-				if addr == 0: f.write(f'; Initial SP\n{"/*"+tab+"00000"+tab+"*/ " if addresses else tab}{case("DW", lo)} {case(disas.Address(word), lo)}\n')
-				elif addr == 2: f.write(f'; Entry point\n{"/*"+tab+"00002"+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n')
-				elif addr == 4: f.write(f'; BRK interrupt entry point\n{"/*"+tab+"00004"+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n')
-				skip_byte = 1
-			elif addr in interrupts:
-				if not table_mode:
-					if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n\n', lo))
-					table_mode = True
-					tbytes_line = 0
-				elif tbytes_mode:
-					if tbytes_line > 0: f.write('\n\n')
-					tbytes_mode = False
-					tbytes_line = 0
-				word = dis.read_word(addr)
-				f.write(f'; Interrupt: {interrupts[addr]}\n{"/*"+tab+format(addr, "05X")+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, 0), lo)}\n\n')
-				skip_byte = 1
-			elif addr in dis.jump_tables:
-				if not table_mode:
-					if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n', lo))
-					table_mode = True
-					tbytes_line = 0
-				elif tbytes_mode:
-					if tbytes_line > 0: f.write('\n\n')
-					else: f.write('\n')
-					tbytes_mode = False
-					tbytes_line = 0
-				entry = dis.jump_tables[addr]
-				size = entry[0]
-				f.write(f'; {addr:05X}\n{dis.data_labels[addr]}:\n')
-				if entry[1]:
-					_size = 0
-					for a in range(addr, addr+size*4, 4):
-						word1 = dis.read_word(a)
-						word2 = dis.read_word(a+2)
-						func_name = process_ins_param(dis, disas.Address(word1, word2))
-						f.write(f'{"/*"+tab+format(a, "05X")+tab+format(word1,"04X")+tab*2+" */ " if addresses else tab}{case("DW OFFSET", lo)} ({func_name})\n')
-						f.write(f'{"/*"+tab+format(a+2, "05X")+tab+format(word2,"04X")+tab*2+" */ " if addresses else tab}{case("DW OFFSET", lo)} ({func_name})\n')
-						_size += 1
-						if a+4 in dis.jump_tables or a+4 in dis.data_labels or a+4 in dis.code:
-							size = _size
-							break
-					skip_byte = size * 4 - 1 if table_mode else size * 2 - 1
-				else:
-					s = entry[2]
-					_size = 0
-					for a in range(addr, addr+size*2, 2):
-						word = dis.read_word(a)
-						f.write(f'{"/*"+tab+format(a, "05X")+tab+format(word,"04X")+tab*2+" */ " if addresses else tab}{case("DW", lo)} {process_ins_param(dis, disas.Address(word, s), lo)}\n')
-						_size += 1
-						if a+2 in dis.jump_tables or a+2 in dis.data_labels or a+2 in dis.code:
-							size = _size
-							break
-					skip_byte = size * 2 - 1 if table_mode else size - 1
-				f.write('\n')
-			elif addr in dis.code:
-				if table_mode:
-					if tbytes_mode:
-						if tbytes_line > 0: f.write('\n')
-						tbytes_mode = False
-						tbytes_line = 0
-					if addr < romwin: f.write(case(f'\nCSEG #{seg} AT {addr:05X}H\n', lo))
-					table_mode = False
-				if addr in dis.labels:
-					if dis.labels[addr][0] == disas.labeltype.FUN: f.write(f'\n; {addr:05X}\n')
-					f.write(f'{dis.labels[addr][1]}:\n')
-				ins = dis.code[addr]
-				instrl = ins[0]
-				instr = ins[1]
-				#string = f'{addr >> 16:X}:{addr & 0xfffe:04X}H\t\t{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))}\t{instr[0]}'
-				if addresses:
-					string = f'/*\t{addr:05X}\t{"".join([format(a, "04X") for a in instrl])}{tab*(3-len(instrl))} */ {case(instr[0], lo)}'
-				else: string = f'\t{case(instr[0], lo)}'
-				is_lea = instr[0] == 'LEA'
-				if len(instr) >= 2: string += ' ' + process_ins_param(dis, instr[1], is_lea, data_bit_labels, lo)
-				if len(instr) == 3: string += ', ' + process_ins_param(dis, instr[2], is_lea, data_bit_labels, lo)
-				f.write(string + '\n')
-				skip_byte = len(instrl) - 1
-			else:
-				if not table_mode:
-					if addr < romwin: f.write(case(f'\nTSEG #{seg} AT {addr:05X}H\n\n', lo))
-					else: f.write('\n')
-					table_mode = True
-					tbytes_line = 0
-				if not tbytes_mode: tbytes_mode = True
-				
-				if addr in table_dt:
-					if tbytes_line > 0: f.write('\n\n')
-					else: f.write('\n')
-					tbytes_line = 0
-					f.write(f'; {addr:05X}\n{table_dt[addr]}:\n')
-				
-				f.write(f'{"/*"+tab+format(addr, "05X")+tab+"*/ " if addresses else tab}{case("DB", lo)} ' if tbytes_line == 0 else ', ')
-				f.write(case(get_byte(rom[addr]), lo))
-				tbytes_line += 1
-				if tbytes_line == 16:
-					f.write('\n')
-					tbytes_line = 0
+# bump when the tables below change
+db_version = 1
+db_schema = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+CREATE TABLE instructions (addr INTEGER PRIMARY KEY, size INTEGER NOT NULL, words BLOB NOT NULL, mnemonic TEXT NOT NULL, text TEXT NOT NULL);
+CREATE TABLE operands (addr INTEGER NOT NULL, n INTEGER NOT NULL, kind TEXT NOT NULL, text TEXT NOT NULL, value INTEGER, symbol TEXT, PRIMARY KEY (addr, n)) WITHOUT ROWID;
+CREATE TABLE labels (addr INTEGER PRIMARY KEY, name TEXT NOT NULL, kind TEXT NOT NULL);
+CREATE TABLE data_labels (addr INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE jump_tables (addr INTEGER PRIMARY KEY, size INTEGER NOT NULL, far INTEGER NOT NULL, seg INTEGER);
+CREATE TABLE xrefs (target INTEGER NOT NULL, source INTEGER NOT NULL, kind TEXT NOT NULL, data INTEGER NOT NULL);
+'''
+# created after the bulk inserts, which is faster than maintaining them row by row
+db_indexes = '''
+CREATE INDEX operands_value ON operands (value) WHERE value IS NOT NULL;
+CREATE INDEX labels_name ON labels (name);
+CREATE INDEX data_labels_name ON data_labels (name);
+CREATE INDEX xrefs_target ON xrefs (target);
+CREATE INDEX xrefs_source ON xrefs (source);
+'''
 
-		if tbytes_mode: f.write('\n')
+# address an operand refers to, or its value for a plain number
+def param_value(param):
+	if type(param) == disas.Address: return param.get_combined()
+	elif type(param) == disas.DSRPrefix and type(param.dsr) == disas.Num and type(param.item) == disas.Address: return (param.dsr.value << 16) | param.item.addr.value
+	elif type(param) == disas.BitOffset and type(param.item) == disas.Address: return param.item.addr.value
+	elif type(param) == disas.Num: return param.value
+	return None
 
-	f.write(case('\nEND\n', lo))
-	
-	logging.info('Copying disassembly to file')
-	with open(out, 'w') as g: g.write(f.getvalue())
+# writes the finished analysis to an SQLite database so tools can query it instead of parsing the listing.
+# the file is replaced as a whole, and everything goes in through one transaction
+def write_database(file, dis, rom, data_bit_labels, filename = '', lo = False):
+	import sqlite3
+	if os.path.exists(f'{file}.tmp'): os.remove(f'{file}.tmp')
+	instructions = []
+	operands = []
+	for addr in sorted(dis.code):
+		instrl, instr = dis.code[addr][:2]
+		is_lea = instr[0] == 'LEA'
+		params = []
+		for n, param in enumerate(instr[1:]):
+			text = case(', '.join(param), lo) if type(param) == list else case(str(param), lo)
+			symbol = process_ins_param(dis, param, is_lea, data_bit_labels, lo)
+			params.append(symbol)
+			operands.append((addr, n, type(param).__name__, text, param_value(param), symbol if symbol != text and type(param) in (disas.Address, disas.DSRPrefix, disas.BitOffset) else None))
+		text = case(instr[0], lo)
+		if params: text += ' ' + ', '.join(params)
+		instructions.append((addr, len(instrl) * 2, b''.join(w.to_bytes(2, 'little') for w in instrl), case(instr[0], lo), text))
+	xrefs = [(target, source, kind.name, data) for data, refs in ((0, dis.xrefs_code), (1, dis.xrefs_data)) for target in refs for source, kind in refs.get(target)]
+
+	db = sqlite3.connect(f'{file}.tmp', isolation_level = None)
+	try:
+		db.execute('PRAGMA journal_mode = OFF')
+		db.execute('PRAGMA synchronous = OFF')
+		db.execute('BEGIN')
+		for statement in db_schema.split(';'): db.execute(statement)
+		db.executemany('INSERT INTO meta VALUES (?, ?)', (
+			('version', db_version),
+			('engine', f'{disas.cache_version}-{analysis_version}'),
+			('rom', filename),
+			('size', len(rom)),
+			('sha256', hashlib.sha256(rom).hexdigest()),
+		))
+		db.executemany('INSERT INTO instructions VALUES (?, ?, ?, ?, ?)', instructions)
+		db.executemany('INSERT INTO operands VALUES (?, ?, ?, ?, ?, ?)', operands)
+		db.executemany('INSERT INTO labels VALUES (?, ?, ?)', ((addr, label[1], disas.labeltype(label[0]).name) for addr, label in dis.labels.items()))
+		db.executemany('INSERT INTO data_labels VALUES (?, ?)', dis.data_labels.items())
+		db.executemany('INSERT INTO jump_tables VALUES (?, ?, ?, ?)', ((addr, entry[0], entry[1], entry[2] if len(entry) > 2 else None) for addr, entry in dis.jump_tables.items()))
+		db.executemany('INSERT INTO xrefs VALUES (?, ?, ?, ?)', xrefs)
+		for statement in db_indexes.split(';'): db.execute(statement)
+		db.execute('COMMIT')
+		db.execute('ANALYZE')
+	finally: db.close()
+	os.replace(f'{file}.tmp', file)
+
+# parses the DCL and label files once so they can be shared between several ROMs
+def load_inputs(labelfile = '', dclfile = '', stats = None, cache = True):
+	if stats is None: stats = Stats()
+	inputs = {'dcl': None, 'labels': []}
+	if dclfile:
+		logging.info('Loading DCL file')
+		with stats.phase('dcl_parse'):
+			try:
+				reader = dcl.DCLReader(dclfile)
+				if not cache: reader.parse()
+				elif reader.parse_cached(): stats.info['dcl_cache'] = 'hit'
+				else: stats.info['dcl_cache'] = 'miss'
+				inputs['dcl'] = (reader.data_labels, reader.data_bit_labels, os.path.splitext(os.path.basename(dclfile))[0], reader.romwin, dict(sorted(reader.interrupts.items())))
+			except Exception as e: log_exc(logging.warning, e)
+
+	if labelfile:
+		logging.info('Loading label files')
+		with stats.phase('label_load'):
+			for file in labelfile:
+				try:
+					with open(file) as f: inputs['labels'].append(labeltool.load_labels(f, 0))
+				except Exception as e: log_exc(logging.warning, e)
+	return inputs
+
+# loads a ROM with its DCL and label files and runs (or restores from the cache) the analysis.
+# returns (Disassembly, ROM, interrupts, SFR labels, data bit labels, DCL name, ROM window), or None if the ROM cannot be loaded
+def analyse(filename, labelfile = '', dclfile = '', romwin = None, disas_all = False, compact = False, cache = True, inputs = None, workers = 1, stats = None, trace = None, sweep = False):
+	if stats is None: stats = Stats()
+	logging.info('Loading binary')
+	rom = b''
+	with stats.phase('load'):
+		try:
+			rom = disas.map_file(filename)
+			dis = disas.Disassembly(rom, compact = compact)
+		except Exception as e:
+			log_exc(logging.error, e)
+			return None
+	dis.trace = trace
+	stats.info['rom'] = filename
+	stats.info['size'] = len(rom)
+
+	if inputs is None: inputs = load_inputs(labelfile, dclfile, stats, cache)
+	sfr_labels = {}
+	dcl_name = 'foo'
+	data_bit_labels = {}
+
+	interrupts = {}
+	if dclfile:
+		if inputs['dcl'] is not None:
+			_data_labels, _data_bit_labels, dcl_name, _romwin, interrupts = inputs['dcl']
+			for k, v in _data_labels.items():
+				dis.data_labels[k] = v
+				sfr_labels[k] = v
+			for k, v in _data_bit_labels.items(): data_bit_labels[k] = v
+			if romwin is None: romwin = _romwin
+	else:
+		if romwin is None: romwin = 0
+
+	with stats.phase('label_load'):
+		for labels, data_labels, _data_bit_labels in inputs['labels']:
+			for k, v in labels.items():
+				if v[1]: dis.labels[k] = [disas.labeltype.FUN, ('' if v[0].endswith('u8') or (v[0].endswith('_n') and not v[0].endswith('base_n')) or v[0].endswith('_nn') else '_')+v[0].replace('.', '_')]
+				else: dis.labels[k] = [disas.labeltype.LAB, f'_${labels[v[2]][0]}_{v[0][1:]}']
+			for k, v in data_labels.items():
+				name = '_' + v.replace('.', '_')
+				if v == f'd_{k:05X}':
+					if k >= romwin: dis.data_labels[k] = name
+					else: dis.data_labels[k] = f'_unk_{k:05x}'
+				else: dis.data_labels[k] = name
+			for k, v in _data_bit_labels.items(): data_bit_labels[k] = '_' + v
+	key = None
+	cache_file = f'{filename}.cache'
+	stats.info['cache'] = 'off'
+	if cache:
+		try: key = cache_key(rom, [file for file in [dclfile, *(labelfile or [])] if file], romwin, disas_all, sweep)
+		except Exception as e: log_exc(logging.warning, e)
+	# a cached analysis has no events to trace, so tracing always runs the traversal (the cache is still refreshed)
+	with stats.phase('cache_load'): loaded = key is not None and trace is None and dis.load_state(cache_file, key)
+	if loaded:
+		logging.info('Loaded analysis from cache')
+		stats.info['cache'] = 'hit'
+	else:
+		if key is not None: stats.info['cache'] = 'miss'
+		logging.info('Disassembling')
+		with stats.phase('traversal', True): dis.disassemble()
+		logging.info('Disassembling vector table')
+		with stats.phase('vector_table', True):
+			for addr in interrupts:
+				func_addr = dis.read_word(addr)
+				if func_addr not in dis.labels: dis.labels[func_addr] = [disas.labeltype.FUN, f'_int_{interrupts[addr]}']
+				dis.queue_add(func_addr)
+			dis.disassemble()
+		if disas_all:
+			with stats.phase('all_pass', True):
+				logging.info('Adding undetected functions to queue')
+				for addr in dis.labels:
+					if addr not in dis.code: dis.queue_add(addr)
+				logging.info('Disassembling undetected functions')
+				dis.disassemble()
+		if sweep:
+			with stats.phase('sweep', True):
+				logging.info('Sweeping for unreached code')
+				stats.counters['sweep_roots'] = len(dis.sweep(workers))
+				dis.disassemble()
+		if key is not None:
+			logging.info('Saving analysis to cache')
+			with stats.phase('cache_save'):
+				try: dis.save_state(cache_file, key)
+				except Exception as e: log_exc(logging.warning, e)
+	stats.counters.update(dis.counters)
+	stats.counters['code_entries'] = len(dis.code)
+	stats.counters['labels'] = len(dis.labels)
+	stats.counters['data_labels'] = len(dis.data_labels)
+	stats.counters['jump_tables'] = len(dis.jump_tables)
+	stats.counters['code_bytes'] = dis.coverage() * 2
+	stats.info['coverage'] = round(stats.counters['code_bytes'] / len(rom), 4)
+	return dis, rom, interrupts, sfr_labels, data_bit_labels, dcl_name, romwin
+
+def disassemble(filename, out, labelfile = '', dclfile = '', romwin = None, addresses = False, disas_all = False, lo = False, compact = False, flush_size = 0x10000, cache = True, inputs = None, workers = 1, stats = None, trace = None, xrefs = False, sweep = False, db = None):
+	if stats is None: stats = Stats()
+	result = analyse(filename, labelfile, dclfile, romwin, disas_all, compact, cache, inputs, workers, stats, trace, sweep)
+	if result is None: return False
+	dis, rom, interrupts, sfr_labels, data_bit_labels, dcl_name, romwin = result
+
+	logging.info(f'Writing output to {"standard output" if out == "-" else out}')
+	with open_output(out) as sink:
+		f = AsmWriter(sink, flush_size, stats)
+		write_listing(f, dis, rom, interrupts, sfr_labels, data_bit_labels, dcl_name, romwin, addresses, lo, workers, stats, xrefs)
+		f.flush()
+	if db is not None:
+		logging.info(f'Writing analysis database to {db}')
+		with stats.phase('database'): write_database(db, dis, rom, data_bit_labels, filename, lo)
+
+	logging.info('Done.')
+	return True
+
+# bump when the function hash normalisation changes
+func_hash_version = 2
+
+# operand text with code and data addresses masked, so a function hashes the same wherever it and its callees are placed
+# 16-bit pointer displacements are table or data addresses too; short ones (Disp6 off BP/FP) are kept
+def norm_param(param):
+	if type(param) == disas.Address: return '@'
+	elif type(param) == disas.Pointer and param.disp is not None and param.disp.bits == 16: return f'@[{param.register.format() if type(param.register) == disas.Register else param.register}]'
+	elif type(param) == disas.DSRPrefix: return f'{"@" if type(param.dsr) == disas.Num else param.dsr}:{norm_param(param.item)}'
+	elif type(param) == disas.BitOffset and type(param.item) == disas.Address: return f'@.{param.bit}'
+	elif type(param) == list: return ', '.join(param)
+	return str(param)
+
+# (address, name, size in bytes, hash) of every function in address order.
+# a function is every code entry from its FUN label up to the next one, within its segment
+def function_hashes(dis):
+	starts = sorted(addr for addr, label in dis.labels.items() if label[0] == disas.labeltype.FUN and addr in dis.code)
+	addrs = sorted(dis.code)
+	funcs = []
+	i = 0
+	for k, start in enumerate(starts):
+		end = min(starts[k+1] if k+1 < len(starts) else 0x100000, (start | 0xffff) + 1)
+		while addrs[i] < start: i += 1
+		h = hashlib.sha256()
+		size = 0
+		while i < len(addrs) and addrs[i] < end:
+			instrl, instr = dis.code[addrs[i]][:2]
+			h.update(f'{instr[0]} {", ".join(map(norm_param, instr[1:]))}\n'.encode())
+			size += len(instrl) * 2
+			i += 1
+		funcs.append((start, dis.labels[start][1], size, h.hexdigest()[:16]))
+	return funcs
+
+# function_hashes() of a ROM through the function cache (ROM filename with .fncache appended), which lets a repeated
+# diff skip the analysis entirely. returns None if the ROM cannot be loaded
+def load_functions(filename, labelfile = '', dclfile = '', romwin = None, disas_all = False, compact = False, cache = True, inputs = None, workers = 1, stats = None, sweep = False):
+	if stats is None: stats = Stats()
+	key = None
+	cache_file = f'{filename}.fncache'
+	version = func_hash_version
+	if cache:
+		try:
+			with open(filename, 'rb') as f: key = cache_key(f.read(), [file for file in [dclfile, *(labelfile or [])] if file], romwin, disas_all, sweep)
+			with open(cache_file) as f: state = json.load(f)
+			if type(state) == dict and state.get('version') == version and state.get('key') == key:
+				funcs = [(int(addr), str(name), int(size), str(h)) for addr, name, size, h in state['functions']]
+				logging.info(f'Loaded functions of {filename} from cache')
+				return funcs
+		except Exception: pass
+	result = analyse(filename, labelfile, dclfile, romwin, disas_all, compact, cache, inputs, workers, stats, None, sweep)
+	if result is None: return None
+	with stats.phase('function_hashes'): funcs = function_hashes(result[0])
+	if key is not None:
+		try:
+			with open(f'{cache_file}.tmp', 'w') as f: json.dump({'version': version, 'key': key, 'functions': funcs}, f)
+			os.replace(f'{cache_file}.tmp', cache_file)
+		except Exception as e: log_exc(logging.warning, e)
+	return funcs
+
+# pairs the functions of two revisions. identical hashes match first (unchanged, possibly moved), then the remaining
+# functions match by address (changed). returns ([(old, new, changed)], added, removed)
+def match_functions(old, new):
+	by_hash = {}
+	for func in old: by_hash.setdefault(func[3], deque()).append(func)
+	pairs = []
+	left = []
+	for func in new:
+		same = by_hash.get(func[3])
+		if same: pairs.append((same.popleft(), func, False))
+		else: left.append(func)
+	by_addr = {func[0]: func for q in by_hash.values() for func in q}
+	added = []
+	for func in left:
+		match = by_addr.pop(func[0], None)
+		if match is None: added.append(func)
+		else: pairs.append((match, func, True))
+	removed = sorted(by_addr.values())
+	return pairs, added, removed
+
+def write_diff(f, old_name, new_name, pairs, added, removed):
+	unchanged = [pair for pair in pairs if not pair[2]]
+	changed = sorted((pair for pair in pairs if pair[2]), key = lambda pair: pair[1][0])
+	moved = sum(1 for old, new, _ in unchanged if old[0] != new[0])
+	f.write(f'; {old_name} -> {new_name}\n')
+	f.write(f'; {len(unchanged)} unchanged ({moved} moved), {len(changed)} changed, {len(added)} added, {len(removed)} removed\n')
+	if changed:
+		f.write('\n; Changed\n')
+		for old, new, _ in changed: f.write(f'~ {old[0]:05X} -> {new[0]:05X}\t{old[1]}\t({old[2]} -> {new[2]} bytes)\n')
+	if added:
+		f.write('\n; Added\n')
+		for new in added: f.write(f'+ {new[0]:05X}\t{new[1]}\t({new[2]} bytes)\n')
+	if removed:
+		f.write('\n; Removed\n')
+		for old in removed: f.write(f'- {old[0]:05X}\t{old[1]}\t({old[2]} bytes)\n')
+
+# function labels of the label files moved to the matching functions of the new revision. local labels follow
+# only functions that are unchanged, as the offsets inside a changed function cannot be trusted
+def carry_labels(raw_labels, pairs):
+	moved = {old[0]: (new[0], changed) for old, new, changed in pairs}
+	carried = {}
+	for labels in raw_labels:
+		for k, v in labels.items():
+			if v[1]:
+				if k in moved: carried[moved[k][0]] = [v[0], True, None]
+			elif v[2] in moved and not moved[v[2]][1]:
+				carried[k - v[2] + moved[v[2]][0]] = [v[0], False, moved[v[2]][0]]
+	return carried
+
+# compares the functions of two revisions of a ROM. both are analysed the same way, with the DCL file but without the
+# label files, so their function boundaries are comparable; the label files (which describe the old revision) only name
+# the old functions and are carried forward to the new ones
+def diff(old_file, new_file, out, labelfile = '', dclfile = '', romwin = None, compact = False, cache = True, workers = 1, stats = None, sweep = False, carry = None):
+	if stats is None: stats = Stats()
+	inputs = load_inputs(labelfile, dclfile, stats, cache)
+	raw_labels = [labels for labels, data_labels, data_bit_labels in inputs['labels']]
+	inputs = {'dcl': inputs['dcl'], 'labels': []}
+	logging.info(f'Analysing {old_file}')
+	old = load_functions(old_file, '', dclfile, romwin, False, compact, cache, inputs, workers, stats, sweep)
+	logging.info(f'Analysing {new_file}')
+	new = load_functions(new_file, '', dclfile, romwin, False, compact, cache, inputs, workers, stats, sweep)
+	if old is None or new is None: return False
+	names = {k: v[0] for labels in raw_labels for k, v in labels.items() if v[1]}
+	if names: old = [(addr, names.get(addr, name), size, h) for addr, name, size, h in old]
+	with stats.phase('match'): pairs, added, removed = match_functions(old, new)
+	stats.counters.update(functions_old = len(old), functions_new = len(new), changed = sum(1 for pair in pairs if pair[2]), added = len(added), removed = len(removed))
+
+	logging.info(f'Writing diff to {"standard output" if out == "-" else out}')
+	with open_output(out) as sink: write_diff(sink, old_file, new_file, pairs, added, removed)
+	if carry is not None:
+		logging.info(f'Writing carried labels to {carry}')
+		with open(carry, 'w') as f: labeltool.save_labels(f, 0, carry_labels(raw_labels, pairs), {}, {})
 
 	logging.info('Done.')
+	return True
+
+# inputs shared by all ROMs of a batch, set once per worker process
+batch_inputs = None
+
+def batch_init(inputs, level):
+	global batch_inputs
+	batch_inputs = inputs
+	logging.getLogger().setLevel(level)
+
+# kwargs['db'] is a flag here, each ROM gets a database named after its output file
+def batch_worker(filename, out, kwargs):
+	if kwargs.pop('db', False): kwargs['db'] = os.path.splitext(out)[0] + '.db'
+	try: return disassemble(filename, out, inputs = batch_inputs, **kwargs), None
+	except Exception as e: return False, f'[{type(e).__name__}] {e}'
+
+# disassembles several ROMs in a process pool. jobs is a list of (ROM filename, output filename)
+def disassemble_batch(jobs, labelfile = '', dclfile = '', workers = None, **kwargs):
+	import concurrent.futures
+	# outputs are named after the ROM basenames, so ROMs from different directories could overwrite each other's files
+	outputs = {}
+	for filename, out in jobs: outputs.setdefault(os.path.normcase(os.path.abspath(out)), []).append(filename)
+	clashes = [(out, names) for out, names in outputs.items() if len(names) > 1]
+	for out, names in clashes: logging.error(f'{", ".join(names)} would all be written to {out}')
+	if clashes: return False
+	inputs = load_inputs(labelfile, dclfile, cache = kwargs.get('cache', True))
+	failed = 0
+	level = logging.getLogger().getEffectiveLevel()
+	logging.info(f'Disassembling {len(jobs)} ROMs')
+	with concurrent.futures.ProcessPoolExecutor(workers, initializer = batch_init, initargs = (inputs, max(level, logging.WARNING))) as pool:
+		futures = {pool.submit(batch_worker, filename, out, dict(kwargs, labelfile = labelfile, dclfile = dclfile)): filename for filename, out in jobs}
+		for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+			filename = futures[future]
+			try: ok, err = future.result()
+			except Exception as e: ok, err = False, f'[{type(e).__name__}] {e}'
+			if ok: logging.info(f'[{i}/{len(jobs)}] {GREEN}{filename}{END}')
+			else:
+				failed += 1
+				logging.error(f'[{i}/{len(jobs)}] {filename}{": " + err if err else ""}')
+	logging.info(f'Done. {len(jobs) - failed} succeeded, {failed} failed.')
+	return failed == 0
+
+def read_manifest(file):
+	# one ROM filename per line, relative to the manifest. blank lines and lines starting with # are skipped
+	base = os.path.dirname(file)
+	with open(file) as f: return [os.path.join(base, l.strip()) for l in f if l.strip() and not l.lstrip().startswith('#')]
 
 if __name__ == '__main__':
 	import argparse
 	parser = argparse.ArgumentParser(description = 'PyU8disasX command line auto-disassembler.\nDisassembly is compatible with RASU8.', epilog = f'© 2024-2026 GamingWithEvets Inc. Licensed under GPL-v3', formatter_class = argparse.RawDescriptionHelpFormatter)
-	parser.add_argument('file', help = 'filename of ROM to disassemble')
+	parser.add_argument('file', nargs = '*', help = 'filename of ROM to disassemble. several ROMs are disassembled as a batch')
 
 	gr_disas = parser.add_argument_group(f'disassembler {"and labels" if has_labeltool else "options"}')
 	gr_disas.add_argument('-r', '--romwin', type = lambda x: int(x, 0), help = f'ROM window size. if unspecified{" and no DCL file is loaded," if has_labeltool else ""} or ROM window is 0, no ROM window will be present{". if specified, overrides DCL specification" if has_labeltool else ""}')
@@ -323,21 +838,84 @@ if __name__ == '__main__':
 		gr_disas.add_argument('-l', '--label', action = 'append', help = 'add a label file. data labels override DCL specification and are added to the symbol definitions')
 		gr_disas.add_argument('-d', '--dcl', help = 'load a DCL file. if unspecified, default DCL name will be "foo"')
 		gr_disas.add_argument('--all', action = 'store_true', help = 'disassemble all functions listed in all provided label files')
+	gr_disas.add_argument('--no-cache', action = 'store_true', help = 'do not load or save the analysis cache (ROM filename with .cache appended)')
+	gr_disas.add_argument('--sweep', action = 'store_true', help = 'after the traversal, sweep each segment linearly for code it did not reach and disassemble it as functions. uses the -j worker processes')
+	gr_disas.add_argument('--compact', action = 'store_true', help = 'keep decoded instructions in a compact columnar store. lowers memory use on large ROMs at some speed cost')
 
 	gr_output = parser.add_argument_group('output options')
-	gr_output.add_argument('-o', '--output', help = 'filename of output assembly file (default: ROM filename with ASM extension)')
+	gr_output.add_argument('-o', '--output', help = 'filename of output assembly file, or - for standard output (default: ROM filename with ASM extension)')
+	gr_output.add_argument('--flush-size', type = lambda x: int(x, 0), default = 0x10000, help = 'number of characters to buffer before writing to the output (default: 0x10000)')
 	gr_output.add_argument('-a', '--addresses', action = 'store_true', help = 'add addresses and raw bytes/words to disassembly')
 	gr_output.add_argument('--lowercase', action = 'store_true', help = 'force all instructions and number expressions to lowercase')
+	gr_output.add_argument('--db', action = 'store_true', help = 'also write the analysis (instructions, operands, labels, jump tables and xrefs) to an SQLite database named after the output file with DB extension, or after the ROM file when writing to standard output')
+	gr_output.add_argument('-x', '--xrefs', action = 'store_true', help = 'add a comment listing the callers of each function')
+	
+	gr_diff = parser.add_argument_group('diff options')
+	gr_diff.add_argument('--diff', metavar = 'OLD', help = f'compare the functions of the ROM with those of an older revision OLD and write a report of added, removed and changed functions instead of a listing (default output: ROM filename with DIFF extension){". label files apply to OLD" if has_labeltool else ""}. function hashes are cached (ROM filename with .fncache appended)')
+	if has_labeltool: gr_diff.add_argument('--carry-labels', metavar = 'FILE', help = 'with --diff, save the function labels of OLD, moved to the matching functions of the ROM, to the label file FILE')
+
+	gr_batch = parser.add_argument_group('batch options')
+	gr_batch.add_argument('-m', '--manifest', action = 'append', help = 'add the ROMs listed in a manifest file (one filename per line) to the batch')
+	gr_batch.add_argument('-j', '--jobs', type = int, help = 'number of worker processes for a batch (default: number of CPUs). for a single ROM, number of processes rendering its segments (default: 1)')
 	
 	gr_misc = parser.add_argument_group('miscellaneous')
 	gr_misc.add_argument('--debug', action = 'store_true', help = 'enable debug logs')
+	gr_misc.add_argument('--stats', choices = ('json',), help = 'print per-phase timings and counters when done, to standard output (standard error if the disassembly goes there). single ROM only')
+	gr_misc.add_argument('--profile', metavar = 'FILE', help = 'save a cProfile capture of the traversal to FILE (readable with pstats). single ROM only')
+	gr_misc.add_argument('--trace', metavar = 'FILE', help = 'write traversal events (jump tables, overlap removals, label promotions) to FILE as JSON lines. single ROM only')
 
 	args = parser.parse_args()
 
 	if args.debug: logging.basicConfig(format = f'{DARK_GRAY}[%(asctime)s] [%(filename)s:%(funcName)s:%(lineno)d] %(levelname)s: {END}%(message)s', datefmt = '%d/%m/%Y %H:%M:%S', level = logging.DEBUG, force = True)
 
-	if args.output is None: output = os.path.splitext(args.file)[0] + '.asm'
-	else: output = args.output
+	files = list(args.file)
+	if args.manifest:
+		for file in args.manifest:
+			try: files += read_manifest(file)
+			except Exception as e:
+				log_exc(logging.error, e)
+				sys.exit(1)
+	if not files: parser.error('no ROM specified')
 
-	if has_labeltool: disassemble(args.file, output, args.label, args.dcl, args.romwin, args.addresses, args.all, args.lowercase)
-	else: disassemble(args.file, output, romwin = args.romwin, addresses = args.addresses, lo = args.lowercase)
+	if args.diff is not None and (args.trace or args.db or args.xrefs): parser.error('--trace, --db and --xrefs cannot be used with --diff')
+	if has_labeltool and args.carry_labels and args.diff is None: parser.error('--carry-labels requires --diff')
+
+	if len(files) == 1 and not args.manifest:
+		if args.output is None: output = os.path.splitext(args.file[0])[0] + ('.diff' if args.diff is not None else '.asm')
+		else: output = args.output
+
+		db = os.path.splitext(args.file[0] if output == '-' else output)[0] + '.db' if args.db else None
+		stats = Stats(args.profile is not None)
+		trace = None
+		if args.trace is not None:
+			try: trace_file = open(args.trace, 'w')
+			except Exception as e:
+				log_exc(logging.error, e)
+				sys.exit(1)
+			trace = disas.Trace(sink = lambda record: trace_file.write(disas.Trace.to_json(record) + '\n'))
+		wall = time.perf_counter()
+		cpu = time.process_time()
+		if args.diff is not None:
+			if has_labeltool: ok = diff(args.diff, args.file[0], output, args.label, args.dcl, args.romwin, args.compact, not args.no_cache, args.jobs or 1, stats, args.sweep, args.carry_labels)
+			else: ok = diff(args.diff, args.file[0], output, romwin = args.romwin, compact = args.compact, cache = not args.no_cache, workers = args.jobs or 1, stats = stats, sweep = args.sweep)
+		elif has_labeltool: ok = disassemble(args.file[0], output, args.label, args.dcl, args.romwin, args.addresses, args.all, args.lowercase, args.compact, args.flush_size, not args.no_cache, workers = args.jobs or 1, stats = stats, trace = trace, xrefs = args.xrefs, sweep = args.sweep, db = db)
+		else: ok = disassemble(args.file[0], output, romwin = args.romwin, addresses = args.addresses, lo = args.lowercase, compact = args.compact, flush_size = args.flush_size, cache = not args.no_cache, workers = args.jobs or 1, stats = stats, trace = trace, xrefs = args.xrefs, sweep = args.sweep, db = db)
+		if trace is not None: trace_file.close()
+		stats.info['wall'] = time.perf_counter() - wall
+		stats.info['cpu'] = time.process_time() - cpu
+		if args.profile is not None and ok:
+			try: stats.profiler.dump_stats(args.profile)
+			except Exception as e: log_exc(logging.warning, e)
+		if args.stats == 'json':
+			json.dump(stats.to_dict(), sys.stderr if output == '-' else sys.stdout, indent = 2)
+			print(file = sys.stderr if output == '-' else sys.stdout)
+	else:
+		if args.stats or args.profile or args.trace or args.diff: parser.error('--stats, --profile, --trace and --diff cannot be used with a batch')
+		# -o names an output directory in batch mode
+		if args.output == '-': parser.error('cannot write a batch to standard output')
+		if args.output is not None: os.makedirs(args.output, exist_ok = True)
+		jobs = [(file, os.path.join(args.output, os.path.splitext(os.path.basename(file))[0] + '.asm') if args.output is not None else os.path.splitext(file)[0] + '.asm') for file in files]
+		kwargs = dict(romwin = args.romwin, addresses = args.addresses, lo = args.lowercase, compact = args.compact, flush_size = args.flush_size, cache = not args.no_cache, xrefs = args.xrefs, sweep = args.sweep, db = args.db)
+		if has_labeltool: ok = disassemble_batch(jobs, args.label, args.dcl, args.jobs, disas_all = args.all, **kwargs)
+		else: ok = disassemble_batch(jobs, workers = args.jobs, **kwargs)
+		if not ok: sys.exit(1)
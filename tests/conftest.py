@@ -0,0 +1,25 @@
+import os
+import sys
+import struct
+import logging
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+logging.disable(logging.WARNING)
+
+import gen_rom
+
+@pytest.fixture(scope = 'session')
+def rom():
+	# a generated two-segment ROM with calls, DSR prefixes, near and far jump tables
+	return bytes(gen_rom.generate(0x20000, 5, 80, 4, 4))
+
+def w16(rom, a, *ws): rom[a:a+2*len(ws)] = struct.pack(f'<{len(ws)}H', *ws)
+
+def make_rom(words, size = 0x10000):
+	# a ROM of 0xFF padding with the given {address: (word, ...)} written into it
+	rom = bytearray(b'\xff' * size)
+	for a, ws in words.items(): w16(rom, a, *ws)
+	return bytes(rom)
@@ -0,0 +1,89 @@
+import os
+import json
+import pickle
+import pytest
+import disas
+import main_cli
+from conftest import make_rom
+
+def analysed(rom, compact = False):
+	dis = disas.Disassembly(rom, compact = compact)
+	dis.disassemble()
+	return dis
+
+def snapshot(dis):
+	return ([(addr, repr(dis.code[addr])) for addr in dis.code], dis.labels, dis.data_labels, dis.jump_tables, dis.conds,
+		[(t, dis.xrefs_code.get(t)) for t in dis.xrefs_code], [(t, dis.xrefs_data.get(t)) for t in dis.xrefs_data], dis.coverage())
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_round_trip(rom, tmp_path, compact):
+	dis = analysed(rom, compact)
+	dis.save_state(tmp_path / 'a.cache', 'k')
+	loaded = disas.Disassembly(rom, compact = compact)
+	assert loaded.load_state(tmp_path / 'a.cache', 'k')
+	assert snapshot(loaded) == snapshot(dis)
+
+def test_rejects_other_key_and_version(rom, tmp_path):
+	dis = analysed(rom)
+	dis.save_state(tmp_path / 'a.cache', 'k')
+	fresh = disas.Disassembly(rom)
+	assert not fresh.load_state(tmp_path / 'a.cache', 'other')
+	with open(tmp_path / 'a.cache') as f: state = json.load(f)
+	state['version'] = 'old'
+	with open(tmp_path / 'a.cache', 'w') as f: json.dump(state, f)
+	assert not fresh.load_state(tmp_path / 'a.cache', 'k')
+	assert len(fresh.code) == 0
+
+class Payload:
+	def __reduce__(self): return (os.system, ('exit 1',))
+
+@pytest.mark.parametrize('content', [b'', b'{', b'[]', pickle.dumps(Payload())])
+def test_rejects_malformed(rom, tmp_path, content):
+	(tmp_path / 'a.cache').write_bytes(content)
+	fresh = disas.Disassembly(rom)
+	assert not fresh.load_state(tmp_path / 'a.cache', 'k')
+
+def test_rejects_inconsistent_columns(rom, tmp_path):
+	dis = analysed(rom)
+	dis.save_state(tmp_path / 'a.cache', 'k')
+	with open(tmp_path / 'a.cache') as f: state = json.load(f)
+	state['code']['lengths'].pop()
+	with open(tmp_path / 'a.cache', 'w') as f: json.dump(state, f)
+	fresh = disas.Disassembly(rom)
+	assert not fresh.load_state(tmp_path / 'a.cache', 'k')
+	assert len(fresh.code) == 0 and not fresh.labels
+
+def test_key_depends_on_versions(rom, monkeypatch):
+	key = main_cli.cache_key(rom, [], None, False, False)
+	assert main_cli.cache_key(rom, [], None, False, False) == key
+	assert main_cli.cache_key(rom, [], None, True, False) != key
+	monkeypatch.setattr(main_cli, 'analysis_version', main_cli.analysis_version + 1)
+	changed = main_cli.cache_key(rom, [], None, False, False)
+	assert changed != key
+	monkeypatch.setattr(disas, 'cache_version', disas.cache_version + 1)
+	assert main_cli.cache_key(rom, [], None, False, False) not in (key, changed)
+
+# a DSR #5 prefix before instructions without memory operand, which are kept as exact entries
+SPLIT = {0: (0xf000, 0x0100, 0x0100), 0x100: (0xe305, 0x0001, 0x0001, 0x0001, 0xfe1f)}
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_round_trip_exact_entries(tmp_path, compact):
+	rom = make_rom(SPLIT)
+	dis = analysed(rom, compact)
+	assert [len(dis.code[addr][0]) for addr in (0x100, 0x102)] == [1, 1]
+	dis.save_state(tmp_path / 'a.cache', 'k')
+	with open(tmp_path / 'a.cache') as f: assert json.load(f)['code']['flags'][:2] == [2, 2]
+	loaded = disas.Disassembly(rom, compact = compact)
+	assert loaded.load_state(tmp_path / 'a.cache', 'k')
+	assert snapshot(loaded) == snapshot(dis)
+
+def test_loaded_entries_are_independent(tmp_path):
+	# the same instruction twice, so a loaded dict decodes it once
+	rom = make_rom({0: (0xf000, 0x0100, 0x0100), 0x100: (0x0001, 0x0001, 0xfe1f)})
+	analysed(rom).save_state(tmp_path / 'a.cache', 'k')
+	loaded = disas.Disassembly(rom)
+	assert loaded.load_state(tmp_path / 'a.cache', 'k')
+	assert repr(loaded.code[0x100]) == repr(loaded.code[0x102])
+	loaded.code[0x100][1][2].sign = False
+	loaded.code[0x100][0][0] = 0x0002
+	assert loaded.code[0x102][1][2].sign and loaded.code[0x102][0] == [0x0001]
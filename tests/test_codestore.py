@@ -0,0 +1,32 @@
+import pickle
+import pytest
+import disas
+
+def listing(dis): return [(addr, repr(dis.code[addr])) for addr in dis.code]
+
+def test_compact_matches_dict(rom):
+	plain = disas.Disassembly(rom)
+	plain.disassemble()
+	compact = disas.Disassembly(rom, compact = True)
+	compact.disassemble()
+	assert type(compact.code) == disas.CodeStore
+	assert sorted(listing(compact)) == sorted(listing(plain))
+	assert list(compact.code) == sorted(compact.code)
+	for addr in plain.code: assert compact.code.length(addr) == len(plain.code[addr][0])
+
+def test_set_exact_round_trip(rom):
+	plain = disas.Disassembly(rom)
+	plain.disassemble()
+	table = disas.Disassembly._Disassembly__decode_table
+	store = disas.CodeStore(table)
+	for addr in plain.code: store.set_exact(addr, plain.code[addr])
+	for addr in plain.code: store[addr] = plain.code[addr]
+	assert len(store) == len(plain.code)
+	assert [(addr, repr(store[addr])) for addr in store] == sorted(listing(plain))
+	copy = pickle.loads(pickle.dumps(store))
+	copy.bind(table)
+	assert [(addr, repr(copy[addr])) for addr in copy] == [(addr, repr(store[addr])) for addr in store]
+	first = next(iter(plain.code))
+	del store[first]
+	assert first not in store and len(store) == len(plain.code) - 1
+	with pytest.raises(KeyError): store[first]
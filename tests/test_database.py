@@ -0,0 +1,48 @@
+import sqlite3
+import pytest
+import disas
+import main_cli
+
+@pytest.fixture(scope = 'module')
+def exported(rom, tmp_path_factory):
+	dis = disas.Disassembly(rom)
+	dis.disassemble()
+	file = str(tmp_path_factory.mktemp('db') / 'a.db')
+	main_cli.write_database(file, dis, rom, {}, 'a.bin')
+	db = sqlite3.connect(file)
+	yield dis, db
+	db.close()
+
+def test_tables(exported):
+	dis, db = exported
+	assert db.execute('SELECT value FROM meta WHERE key = ?', ('version',)).fetchone() == (main_cli.db_version,)
+	rows = db.execute('SELECT addr, size, words, mnemonic FROM instructions ORDER BY addr').fetchall()
+	assert [row[0] for row in rows] == sorted(dis.code)
+	for addr, size, words, mnemonic in rows:
+		instrl, instr = dis.code[addr][:2]
+		assert size == len(instrl) * 2 and words == b''.join(w.to_bytes(2, 'little') for w in instrl) and mnemonic == instr[0]
+	assert db.execute('SELECT count(*) FROM operands').fetchone()[0] == sum(len(dis.code[addr][1]) - 1 for addr in dis.code)
+	assert dict(db.execute('SELECT addr, name FROM labels')) == {addr: label[1] for addr, label in dis.labels.items()}
+	assert dict(db.execute('SELECT addr, name FROM data_labels')) == dis.data_labels
+	assert {row[0]: row[1:] for row in db.execute('SELECT addr, size, far FROM jump_tables')} == {addr: (entry[0], int(entry[1])) for addr, entry in dis.jump_tables.items()}
+	xrefs = sorted(db.execute('SELECT target, source, kind FROM xrefs WHERE data = 0'))
+	assert xrefs == sorted((t, s, k.name) for t in dis.xrefs_code for s, k in dis.xrefs_code.get(t))
+
+def test_operand_symbols(exported):
+	dis, db = exported
+	# every call operand resolves to its target, named by the target's label
+	for addr, value, symbol in db.execute("SELECT o.addr, o.value, o.symbol FROM operands o JOIN instructions i ON i.addr = o.addr WHERE i.mnemonic = 'BL' AND o.kind = 'Address'"):
+		assert value in dis.labels and symbol == dis.labels[value][1]
+
+@pytest.mark.parametrize('query, index', [
+	('SELECT * FROM instructions WHERE addr BETWEEN 256 AND 512', 'PRIMARY KEY'),
+	("SELECT * FROM labels WHERE name = '$$start_up'", 'labels_name'),
+	("SELECT * FROM data_labels WHERE name = 'x'", 'data_labels_name'),
+	('SELECT * FROM xrefs WHERE target = 512', 'xrefs_target'),
+	('SELECT * FROM xrefs WHERE source = 512', 'xrefs_source'),
+	('SELECT * FROM operands WHERE value = 512', 'operands_value'),
+])
+def test_queries_use_indexes(exported, query, index):
+	dis, db = exported
+	plan = ' '.join(row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + query))
+	assert 'SCAN' not in plan and index in plan
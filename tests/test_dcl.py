@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import types
+import pytest
+
+try: import dcl
+except ImportError:
+	# labeltool is a separate package that dcl only uses to write label files, which these tests do not do. the stub
+	# is removed again so other modules keep seeing labeltool as missing
+	stub = types.ModuleType('labeltool')
+	stub.labeltool = types.ModuleType('labeltool.labeltool')
+	sys.modules.update({'labeltool': stub, 'labeltool.labeltool': stub.labeltool})
+	try: import dcl
+	finally:
+		del sys.modules['labeltool']
+		del sys.modules['labeltool.labeltool']
+
+DCL = '#RAM\nROMWINDOW\t0H\t,\t7FFFH\n#DEFCODE\nINT_A\t08H\n#DEFDATA\nSFR_X\t0F000H\n#DEFBIT\nBIT_X\tSFR_X.3\n'
+
+def parsed(reader): return reader.data_labels, reader.data_bit_labels, reader.interrupts, reader.romwin
+
+def test_cache_round_trip(tmp_path):
+	(tmp_path / 't.dcl').write_text(DCL)
+	reader = dcl.DCLReader(str(tmp_path / 't.dcl'))
+	assert not reader.parse_cached()
+	cached = dcl.DCLReader(str(tmp_path / 't.dcl'))
+	assert cached.parse_cached()
+	assert parsed(cached) == parsed(reader) == ({0xf000: 'SFR_X'}, {'SFR_X.3': 'BIT_X'}, {8: 'INT_A'}, 0x8000)
+
+def test_cache_follows_contents(tmp_path):
+	(tmp_path / 't.dcl').write_text(DCL)
+	dcl.DCLReader(str(tmp_path / 't.dcl')).parse_cached()
+	# same contents with a new mtime is still a hit, new contents are parsed again
+	os.utime(tmp_path / 't.dcl', ns = (1, 1))
+	assert dcl.DCLReader(str(tmp_path / 't.dcl')).parse_cached()
+	(tmp_path / 't.dcl').write_text(DCL + '#DEFDATA\nSFR_Y\t0F002H\n')
+	os.utime(tmp_path / 't.dcl', ns = (2, 2))
+	reader = dcl.DCLReader(str(tmp_path / 't.dcl'))
+	assert not reader.parse_cached()
+	assert reader.data_labels == {0xf000: 'SFR_X', 0xf002: 'SFR_Y'}
+
+@pytest.mark.parametrize('state', [
+	'not json',
+	json.dumps({'version': dcl.cache_version}),
+	json.dumps({'version': dcl.cache_version, 'key': ['a', 1]}),
+	json.dumps({'version': dcl.cache_version, 'key': None, 'data_labels': []}),
+])
+def test_malformed_cache_is_reparsed(tmp_path, state):
+	(tmp_path / 't.dcl').write_text(DCL)
+	(tmp_path / 't.dcl.cache').write_text(state)
+	reader = dcl.DCLReader(str(tmp_path / 't.dcl'))
+	assert not reader.load_cache(str(tmp_path / 't.dcl.cache'))
+	assert not reader.parse_cached()
+	assert reader.data_labels == {0xf000: 'SFR_X'}
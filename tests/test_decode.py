@@ -0,0 +1,43 @@
+import pytest
+import disas
+
+def first_match(word):
+	# the original linear decoder: first entry of the DSR prefix table, then of the instruction table, whose fixed bits match
+	for _instr in disas.Disassembly._Disassembly__instrs_dsr:
+		mask = 0
+		if _instr[2] is not None: mask |= _instr[2][0]
+		if word & (mask ^ 0xffff) == _instr[1]: return _instr, True
+	for _instr in disas.Disassembly._Disassembly__instrs:
+		mask = 0
+		if _instr[2] is not None: mask |= _instr[2][0]
+		if _instr[3] is not None: mask |= _instr[3][0]
+		if word & (mask ^ 0xffff) == _instr[1]: return _instr, False
+	return None
+
+def test_decode_table_matches_first_match():
+	dis = disas.Disassembly(bytes(2))
+	for word in range(0x10000):
+		expected = first_match(word)
+		if expected is None:
+			with pytest.raises(RuntimeError): dis.decode(word)
+			continue
+		_instr, dsr = dis.decode(word)
+		assert _instr is expected[0] and dsr == expected[1], hex(word)
+
+def test_decode_table_operand_values():
+	table = disas.build_decode_table(disas.Disassembly._Disassembly__instrs_dsr, disas.Disassembly._Disassembly__instrs)
+	for word in range(0x10000):
+		entry = table[word]
+		if entry is None: continue
+		_instr, dsr, op0, op1, _ = entry
+		ops = _instr[2:3] if dsr else _instr[2:4]
+		assert [op0, op1][:len(ops)] == [None if op is None else (word & op[0]) >> op[1] for op in ops], hex(word)
+
+def test_register_lists_are_owned_lists():
+	table = disas.build_decode_table(disas.Disassembly._Disassembly__instrs_dsr, disas.Disassembly._Disassembly__instrs)
+	assert disas.rebuild_instr(table, 0, [0xfe8e]) == ['POP', ['LR', 'PSW', 'PC']]
+	a = disas.rebuild_instr(table, 0, [0xf8ce])
+	b = disas.rebuild_instr(table, 2, [0xf8ce])
+	assert a == b == ['PUSH', ['LR']]
+	a[1].append('EA')
+	assert b[1] == ['LR'] and disas.rebuild_instr(table, 0, [0xf8ce])[1] == ['LR']
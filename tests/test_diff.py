@@ -0,0 +1,49 @@
+import disas
+import main_cli
+from conftest import make_rom
+
+def diff_rom(func, table, extra = ()):
+	# entry point calls func, which loads from table[ER0] and returns
+	return make_rom({0: (0xf000, 0x0100, 0x0100), 0x100: (0xf001, func, 0xfe1f), func: (*extra, 0xa208, table, 0xfe1f)})
+
+def hashes(rom):
+	dis = disas.Disassembly(rom)
+	dis.disassemble()
+	return main_cli.function_hashes(dis)
+
+def test_norm_param_masks_addresses():
+	assert main_cli.norm_param(disas.Address(0x1234, 1)) == '@'
+	assert main_cli.norm_param(disas.Pointer(disas.get_register(2, 0), disas.Num(16, 0x8000, False))) == '@[ER0]'
+	assert main_cli.norm_param(disas.Pointer(disas.get_register(2, 12), disas.Num(6, 4, False))) == str(disas.Pointer(disas.get_register(2, 12), disas.Num(6, 4, False)))
+	assert main_cli.norm_param(disas.DSRPrefix(disas.Num(4, 2, False), disas.Address(0x9000))) == '@:@'
+
+def test_moved_function_with_relocated_table_is_unchanged():
+	old = hashes(diff_rom(0x200, 0x8000))
+	new = hashes(diff_rom(0x300, 0x9000))
+	pairs, added, removed = main_cli.match_functions(old, new)
+	assert [(o[0], n[0], changed) for o, n, changed in sorted(pairs)] == [(0x100, 0x100, False), (0x200, 0x300, False)]
+	assert added == [] and removed == []
+
+def test_changed_added_removed():
+	old = hashes(diff_rom(0x200, 0x8000))
+	changed = hashes(diff_rom(0x200, 0x8000, (0x0001,)))
+	pairs, added, removed = main_cli.match_functions(old, changed)
+	assert [(o[0], n[0], c) for o, n, c in sorted(pairs)] == [(0x100, 0x100, False), (0x200, 0x200, True)]
+	moved = hashes(diff_rom(0x300, 0x8000, (0x0001,)))
+	pairs, added, removed = main_cli.match_functions(old, moved)
+	assert [p[1][0] for p in pairs] == [0x100]
+	assert [f[0] for f in added] == [0x300] and [f[0] for f in removed] == [0x200]
+
+def test_duplicate_bodies_pair_in_order():
+	old = [(0x100, 'a', 2, 'x'), (0x200, 'b', 2, 'x')]
+	new = [(0x110, '_f_00110', 2, 'x'), (0x210, '_f_00210', 2, 'x')]
+	pairs, added, removed = main_cli.match_functions(old, new)
+	assert [(o[0], n[0], c) for o, n, c in pairs] == [(0x100, 0x110, False), (0x200, 0x210, False)]
+
+def test_carry_labels():
+	old = [(0x100, 'foo', 10, 'a'), (0x300, 'bar', 6, 'c')]
+	new = [(0x110, '_f_00110', 10, 'a'), (0x300, '_f_00300', 6, 'y')]
+	pairs, added, removed = main_cli.match_functions(old, new)
+	labels = {0x100: ['foo', True, None], 0x104: ['.l', False, 0x100], 0x300: ['bar', True, None], 0x302: ['.m', False, 0x300], 0x500: ['gone', True, None]}
+	# local labels only follow unchanged functions
+	assert main_cli.carry_labels([labels], pairs) == {0x110: ['foo', True, None], 0x114: ['.l', False, 0x110], 0x300: ['bar', True, None]}
@@ -0,0 +1,43 @@
+import io
+import os
+import gzip
+import pytest
+import disas
+import main_cli
+from conftest import make_rom
+
+# near and far jump tables, __indru8, DSR prefixed and bit accesses, a conditional branch and a string.
+# tests/data/listing*.asm.gz are the listings the original single-pass writer produced for this ROM
+GOLDEN_ROM = bytearray(make_rom({0: (0xf000, 0x0100, 0x0100),
+	0x100: (0xe240, 0x9010, 0x0400, 0xe305, 0x9010, 0x1234, 0xf001, 0x0140, 0xf001, 0x0200, 0xa208, 0x0300, 0xf022),
+	0x140: (0xa208, 0x0340, 0xf25e, 0xf001, 0x01c0, 0xfe1f),
+	0x180: (0xfe1f, 0x0001, 0xfe1f), 0x1a0: (0xfe1f, 0xfe1f, 0xfe1f), 0x1c0: (0xf28e,),
+	0x200: (0xa0b0, 0x0402, 0xc801, 0x0001, 0xfe1f),
+	0x300: (0x0180, 0x0182, 0), 0x340: (0x01a0, 0, 0x01a4, 0)}))
+GOLDEN_ROM[0x400:0x40c] = b'Hello world\0'
+
+@pytest.mark.parametrize('name, options', [
+	('listing.asm.gz', {}),
+	('listing_lo.asm.gz', {'romwin': 0x200, 'addresses': True, 'lo': True}),
+])
+def test_listing_matches_golden(tmp_path, name, options):
+	(tmp_path / 'g.bin').write_bytes(GOLDEN_ROM)
+	assert main_cli.disassemble(str(tmp_path / 'g.bin'), str(tmp_path / 'g.asm'), cache = False, flush_size = 0x100, **options)
+	with gzip.open(os.path.join(os.path.dirname(__file__), 'data', name), 'rt') as f: assert (tmp_path / 'g.asm').read_text() == f.read()
+
+def listing(dis, rom, workers, **options):
+	f = io.StringIO()
+	main_cli.write_listing(f, dis, rom, {}, {}, {}, workers = workers, **options)
+	return f.getvalue()
+
+@pytest.mark.parametrize('options', [{}, {'addresses': True, 'lo': True, 'xrefs': True, 'romwin': 0x8000}])
+def test_parallel_listing_matches_serial(rom, options):
+	dis = disas.Disassembly(rom)
+	dis.disassemble()
+	serial = listing(dis, rom, 1, **options)
+	assert serial.lower().count('cseg #1') >= 1
+	assert listing(dis, rom, 2, **options) == serial
+	compact = disas.Disassembly(rom, compact = True)
+	compact.disassemble()
+	assert listing(compact, rom, 1, **options) == serial
+	assert listing(compact, rom, 2, **options) == serial
@@ -0,0 +1,39 @@
+import pytest
+import main_cli
+
+def test_output_replaced_on_success(tmp_path):
+	out = tmp_path / 'a.asm'
+	out.write_text('old')
+	with main_cli.open_output(str(out)) as f: f.write('new')
+	assert out.read_text() == 'new'
+	assert list(tmp_path.iterdir()) == [out]
+
+def test_output_kept_on_failure(tmp_path):
+	out = tmp_path / 'a.asm'
+	out.write_text('old')
+	with pytest.raises(ValueError):
+		with main_cli.open_output(str(out)) as f:
+			f.write('partial')
+			raise ValueError
+	assert out.read_text() == 'old'
+	assert list(tmp_path.iterdir()) == [out]
+
+def test_failed_listing_leaves_no_file(tmp_path, monkeypatch):
+	rom = tmp_path / 'a.bin'
+	rom.write_bytes(b'\x00\xf0\x00\x01\x00\x01' + b'\xff' * 0xfa + b'\x1f\xfe' + b'\xff' * 0xfefe)
+	def fail(*args, **kwargs): raise ValueError('listing failed')
+	monkeypatch.setattr(main_cli, 'write_listing', fail)
+	with pytest.raises(ValueError):
+		main_cli.disassemble(str(rom), str(tmp_path / 'a.asm'), cache = False)
+	assert not (tmp_path / 'a.asm').exists() and not (tmp_path / 'a.asm.tmp').exists()
+
+def test_batch_rejects_clashing_outputs(tmp_path):
+	roms = []
+	for d in ('x', 'y'):
+		(tmp_path / d).mkdir()
+		roms.append(tmp_path / d / 'a.bin')
+		roms[-1].write_bytes(b'\x00\xf0\x00\x01\x00\x01' + b'\xff' * 0xfa + b'\x1f\xfe' + b'\xff' * 0xfefe)
+	out = tmp_path / 'out'
+	out.mkdir()
+	assert not main_cli.disassemble_batch([(str(rom), str(out / 'a.asm')) for rom in roms], cache = False)
+	assert list(out.iterdir()) == []
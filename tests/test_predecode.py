@@ -0,0 +1,43 @@
+import struct
+import pytest
+import disas
+
+# every instruction word once, in order
+ALL_WORDS = struct.pack('<65536H', *range(0x10000))
+
+def fetched_words(table, word):
+	# words the operand handlers fetch for the instruction word, including the word itself; None if it does not decode
+	entry = table[word]
+	if entry is None: return None
+	_instr, dsr, op0, op1, _ = entry
+	f = disas.WordFetcher(0, [word, 0x0100, 0x0100])
+	f.fetch()
+	try:
+		if dsr: _instr[2][3](f, _instr[2][2], op0)
+		else:
+			if _instr[2] is not None: _instr[2][3](f, _instr[2][2], op0)
+			if _instr[3] is not None: _instr[3][3](f, _instr[3][2], op1)
+	except RuntimeError: return None
+	return f.i
+
+def columns(p): return [list(p.index), list(p.length), list(p.dsr), list(p.flow)]
+
+@pytest.fixture(scope = 'module')
+def predecoded():
+	dis = disas.Disassembly(ALL_WORDS)
+	return dis.predecode(False)[0]
+
+def test_lengths_match_fetches(predecoded):
+	table = disas.Disassembly._Disassembly__decode_table
+	for word in range(0x10000):
+		n = fetched_words(table, word)
+		if n is None: assert predecoded.flow[word] == disas.flowtype.INVALID and predecoded.index[word] == -1, hex(word)
+		else:
+			assert predecoded.length[word] == n, hex(word)
+			assert predecoded.index[word] == table[word][4] and predecoded.dsr[word] == table[word][1], hex(word)
+
+@pytest.mark.skipif(not disas.has_numpy, reason = 'NumPy is not installed')
+def test_numpy_matches_fallback(predecoded):
+	dis = disas.Disassembly(ALL_WORDS)
+	p = dis.predecode(True)[0]
+	assert columns(p) == columns(predecoded)
@@ -0,0 +1,23 @@
+import disas
+from conftest import make_rom
+
+def test_work_queue_is_lifo():
+	q = disas.WorkQueue()
+	for addr in (0x100, 0x200, 0x300): q.push(addr, addr >> 8)
+	assert len(q) == 3 and 0x200 in q
+	assert q.pop() == (0x300, 3)
+	# pushing a queued address moves it to the top with the new snapshot
+	q.push(0x100, 9)
+	assert q.pop() == (0x100, 9)
+	q.remove(0x200)
+	assert len(q) == 0 and 0x200 not in q
+	assert q.peak == 3
+
+def test_queue_add_rejects_mid_instruction():
+	# 00100: BL 00200 (two words), RT
+	dis = disas.Disassembly(make_rom({0: (0xf000, 0x0100, 0x0100), 0x100: (0xf001, 0x0200, 0xfe1f), 0x200: (0xfe1f,)}))
+	dis.disassemble()
+	assert not dis.queue_add(0x102)
+	assert dis.counters['mid_instruction_rejects'] == 1
+	assert dis.queue_add(0x202)
+	assert dis.queue_len() == 1
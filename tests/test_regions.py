@@ -0,0 +1,36 @@
+import random
+import pytest
+import disas
+
+def reference_read(regions, addr, pad_word):
+	# the original lookup: a linear scan over the regions in load order, only at or above max()
+	top = -(-max(start for start, _ in regions) // 0x10000) * 0x10000
+	if top <= addr:
+		for start, code_bytes in regions:
+			if start <= addr < start + len(code_bytes): return (code_bytes[addr-start+1] << 8) | code_bytes[addr-start]
+	return pad_word
+
+LAYOUTS = [
+	[(0, 0x20000)],
+	[(0, 0x10000), (0x30000, 0x8000)],
+	[(0x10000, 0x18000), (0x20000, 0x1000)],
+	[(0x8000, 0x10000), (0x8000, 0x4000)],
+]
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+def test_read_word_matches_linear_lookup(layout):
+	r = random.Random(len(layout))
+	regions = [(start, bytes(r.getrandbits(8) for _ in range(size))) for start, size in layout]
+	dis = disas.Disassembly(pad_word = 0x1234)
+	for start, code_bytes in regions: dis.add_region(start, code_bytes)
+	edges = {a + d for start, code_bytes in regions for a in (start, start + len(code_bytes), start & ~0xffff, (start | 0xffff) + 1) for d in (-2, 0, 2)}
+	addrs = sorted(a for a in edges | {r.randrange(0x50000) & ~1 for _ in range(2000)} if 0 <= a < 0x100000)
+	for addr in addrs: assert dis.read_word(addr) == reference_read(regions, addr, 0x1234), hex(addr)
+	assert dis.read_word(0x100000) == 0x1234
+
+def test_mapped_file(tmp_path):
+	data = bytes(random.Random(0).getrandbits(8) for _ in range(0x20000))
+	(tmp_path / 'a.bin').write_bytes(data)
+	mapped = disas.Disassembly(disas.map_file(tmp_path / 'a.bin'))
+	plain = disas.Disassembly(data)
+	for addr in range(0, 0x20000, 0x101 * 2): assert mapped.read_word(addr) == plain.read_word(addr)
@@ -0,0 +1,36 @@
+import pytest
+import disas
+from conftest import make_rom, w16
+
+# segment 0: vectors to an RT at 00100, followed by an unreached function.
+# segment 1 is never reached: a function at its start, then padding, then another function
+ROM = make_rom({0: (0xf000, 0x0100, 0x0100), 0x100: (0xfe1f,), 0x102: (0x0001, 0xfe1f), 0x10000: (0x0001, 0x0102, 0xfe1f), 0x10200: (0x0102, 0xfe1f)}, 0x20000)
+
+def undecodable(word):
+	try: disas.Disassembly(bytes(2)).decode(word)
+	except RuntimeError: return True
+	return False
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('use_numpy', [False, True] if disas.has_numpy else [False])
+def test_sweep_roots(workers, use_numpy):
+	dis = disas.Disassembly(ROM)
+	dis.disassemble()
+	assert 0x102 not in dis.code
+	assert dis.sweep(workers, use_numpy) == [0x102, 0x10000, 0x10200]
+	dis.disassemble()
+	for addr in (0x102, 0x10000, 0x10200):
+		assert addr in dis.code
+		assert dis.labels[addr] == [disas.labeltype.FUN, f'_f_{addr:05X}']
+	assert dis.code[0x10004][1][0] == 'RT'
+
+def test_sweep_drops_invalid_runs():
+	rom = bytearray(ROM)
+	# a run into an undecodable word is dropped, and no run starts after it until the next padding
+	invalid = next(w for w in range(0x10000) if undecodable(w))
+	w16(rom, 0x10004, invalid, 0xfe1f)
+	dis = disas.Disassembly(bytes(rom))
+	dis.disassemble()
+	assert dis.sweep() == [0x102, 0x10200]
+	dis.disassemble()
+	assert dis.sweep() == []
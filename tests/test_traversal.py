@@ -0,0 +1,126 @@
+import pytest
+import disas
+from conftest import make_rom
+
+def bitmaps(dis):
+	# the coverage bitmaps as sets of addresses: entry starts, and the words after a start inside its entry
+	def addrs(bitmap): return {h << 1 for h in range(len(bitmap) * 8) if bitmap[h >> 3] >> (h & 7) & 1}
+	return addrs(dis._Disassembly__starts), addrs(dis._Disassembly__cont)
+
+def check_coverage(dis):
+	starts = set(dis.code)
+	cont = {addr + i*2 for addr in dis.code for i in range(1, len(dis.code[addr][0]))}
+	assert bitmaps(dis) == (starts, cont)
+	assert dis._Disassembly__code_lo == min(dis.code) and dis._Disassembly__code_hi == max(dis.code)
+	assert dis.coverage() == len(starts | cont)
+
+# 00100: BL 00300, BL 00302, RT. The second call is decoded first and finds BL 00400 at 00302, which the
+# call to 00300 later turns into the Dadr word of L R0, 0F001H at 00300; MOV R4, #0 and RT follow.
+OVERLAP = {0: (0xf000, 0x0100, 0x0100), 0x100: (0xf001, 0x0300, 0xf001, 0x0302, 0xfe1f), 0x300: (0x9010, 0xf001, 0x0400, 0xfe1f), 0x400: (0xfe1f,)}
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_coverage_after_traversal(rom, compact):
+	dis = disas.Disassembly(rom, compact = compact)
+	dis.disassemble()
+	check_coverage(dis)
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_coverage_after_overlap_removal(compact):
+	dis = disas.Disassembly(make_rom(OVERLAP), compact = compact)
+	dis.disassemble()
+	assert dis.counters['overlap_removals'] == 1
+	assert 0x302 not in dis.code and dis.code[0x304][1][0] == 'MOV'
+	check_coverage(dis)
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_jmptable_add_aligns_entries(compact):
+	# RTs at 00200-00204. The near table holds an odd entry, the far table one with a segment word above 0FH
+	dis = disas.Disassembly(make_rom({0: (0xf000, 0x0100, 0x0100), 0x100: (0xfe1f,), 0x200: (0xfe1f, 0xfe1f, 0xfe1f), 0x800: (0x0203, 0x0202), 0x900: (0x0204, 0x0010)}), compact = compact)
+	dis.disassemble()
+	dis.jmptable_add(0x800, 2)
+	dis.jmptable_add(0x900, 1, True)
+	dis.disassemble()
+	assert list(dis.code) == [0x100, 0x202, 0x204]
+	assert dis.labels[0x204] == [disas.labeltype.FUN, '_f_00204']
+	check_coverage(dis)
+	# entries that are already code are decoded again without breaking the bitmaps
+	dis.jmptable_add(0x900, 1, True)
+	dis.disassemble()
+	check_coverage(dis)
+
+def test_code_order_over_incremental_runs():
+	# each run adds entries above and below the existing ones; the third removes 00302 again
+	dis = disas.Disassembly(make_rom({**OVERLAP, 0: (0xf000, 0x0200, 0x0200), 0x80: (0xfe1f,), 0x200: (0xfe1f,), 0x500: (0x0001, 0xfe1f)}))
+	dis.queue_add(0x302)
+	dis.disassemble()
+	assert list(dis.code) == sorted(dis.code) and 0x302 in dis.code
+	dis.queue_add(0x500)
+	dis.queue_add(0x80)
+	dis.disassemble()
+	assert list(dis.code) == sorted(dis.code) and 0x80 in dis.code
+	dis.queue_add(0x300)
+	dis.disassemble()
+	assert list(dis.code) == sorted(dis.code) and 0x302 not in dis.code and 0x304 in dis.code
+	check_coverage(dis)
+
+def rescan_xrefs(dis):
+	# the references a fresh pass over self.code and the jump tables finds, as sorted (target, source, xreftype) lists
+	code, data = [], []
+	for addr in dis.code:
+		for target, kind, is_data in disas.instr_xrefs(dis.code[addr][1]): (data if is_data else code).append((target, addr, kind))
+	for a, entry in dis.jump_tables.items():
+		for k in range(entry[0]):
+			if entry[1]: target = (dis.read_word(a + k*4 + 2) << 16) | dis.read_word(a + k*4)
+			else: target = (entry[2] << 16) | dis.read_word(a + k*2)
+			code.append((target & 0xffffe, a + k*(4 if entry[1] else 2), disas.xreftype.TABLE))
+	return sorted(code), sorted(data)
+
+def xrefs(dis):
+	return (sorted((t, s, k) for t in dis.xrefs_code for s, k in dis.xrefs_code.get(t)),
+		sorted((t, s, k) for t in dis.xrefs_data for s, k in dis.xrefs_data.get(t)))
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_xrefs_match_rescan(rom, compact):
+	dis = disas.Disassembly(rom, compact = compact)
+	dis.disassemble()
+	assert xrefs(dis) == rescan_xrefs(dis)
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_xrefs_after_overlap_removal_and_jmptable_add(compact):
+	dis = disas.Disassembly(make_rom({**OVERLAP, 0x800: (0x0300, 0x0400)}), compact = compact)
+	dis.disassemble()
+	# the call made by the removed BL 00400 at 00302 is gone, the load at 00300 is recorded
+	assert dis.xrefs_code.get(0x400) == [] and dis.xrefs_data.get(0xf001) == [(0x300, disas.xreftype.READ)]
+	assert xrefs(dis) == rescan_xrefs(dis)
+	# table entries that are already code are decoded again, which must not record their references twice
+	dis.jmptable_add(0x800, 2, bl = True)
+	dis.disassemble()
+	assert dis.xrefs_data.get(0xf001) == [(0x300, disas.xreftype.READ)]
+	assert xrefs(dis) == rescan_xrefs(dis)
+
+def test_register_snapshots():
+	dis = disas.Disassembly(bytes(2))
+	dis.set_r(2, 2, 0x40)
+	assert dis.r == bytes((0, 0, 0x40)) + bytes(13)
+	assert dis.get_r(2, 2) == 0x40 and dis.get_r(1, 3) == 0
+	# equal register states are one shared object
+	first = dis.r
+	dis.set_r(1, 2, 0)
+	dis.set_r(2, 2, 0x40)
+	assert dis.r is first
+	dis.set_r(8, 8, 0x7f)
+	assert dis.get_r(4, 8) == 0x7f and dis.get_r(2, 2) == 0x40
+
+def test_register_state_follows_branches():
+	# 00100: MOV ER2, #40H; BL 00200; MOV ER2, #60H; L ER2, [ER0]; B ER2, a near jump table at 00060 with 2 cases.
+	# 00200 is decoded after the fall-through path and still sees ER2 = 40H: L ER2, [ER0]; B ER2, a table at 00040 with 1 case.
+	# 00300: DSR #5 prefixes the load that follows it; 00306: R1 prefixes the next load, which is not a far reference
+	dis = disas.Disassembly(make_rom({0: (0xf000, 0x0100, 0x0100), 0x40: (0x0180, 0), 0x60: (0x0182, 0x0184, 0),
+		0x100: (0xe240, 0xf001, 0x0200, 0xe260, 0x9202, 0xf022), 0x180: (0xfe1f, 0xfe1f, 0xf001, 0x0300, 0xfe1f),
+		0x200: (0x9202, 0xf022), 0x300: (0xe305, 0x9010, 0x1234, 0x901f, 0x9010, 0x2222, 0xfe1f)}))
+	dis.disassemble()
+	assert dis.jump_tables == {0x40: [1, False, 0], 0x60: [2, False, 0]}
+	assert dis.labels[0x180][1] == '_$switch_00202_00180_case0'
+	assert [dis.labels[a][1] for a in (0x182, 0x184)] == ['_$switch_0010a_00182_case0', '_$switch_0010a_00184_case1']
+	assert str(dis.code[0x300][1][2]) == '5H:1234H' and 0x51234 in dis.data_labels
+	assert str(dis.code[0x306][1][2]) == 'R1:2222H' and 0x2222 not in dis.data_labels and 0x12222 not in dis.data_labels